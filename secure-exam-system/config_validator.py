@@ -4,33 +4,148 @@ Configuration Validator
 Validates system_config.json and ensures all required files/directories exist.
 """
 
+import io
 import os
 import sys
-import json
+import stat
 import logging
+import functools
+import contextlib
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+# Linux-only tool: bind posixpath directly rather than going through os.path
+from posixpath import basename as _basename, dirname as _dirname, \
+    expanduser as _expanduser, expandvars as _expandvars, normpath as _normpath
+
+from config_loader import load_config
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+_DEFAULT_PROJECT_ROOT = _dirname(_dirname(os.path.abspath(__file__)))
+
+
+# Outcome of one validate_* section: info lines, errors and warnings
+_SectionResult = namedtuple('_SectionResult', 'infos errors warnings')
+
+
+@functools.lru_cache(maxsize=64)
+def _resolve_path(path_str, project_root):
+    """Expand ${project_root}, ~ and environment variables in a path."""
+    resolved = path_str.replace('${project_root}', project_root)
+    # Fully resolved absolute paths (the common case) skip both env lookups
+    if resolved.startswith('~'):
+        resolved = _expanduser(resolved)
+    if '$' in resolved:
+        resolved = _expandvars(resolved)
+    return resolved
+
+
+def _path_kind(path):
+    """Return 'dir', 'file' or None for a path using a single stat() call."""
+    try:
+        mode = os.stat(path).st_mode
+    except (OSError, ValueError):
+        return None
+    if stat.S_ISDIR(mode):
+        return 'dir'
+    if stat.S_ISREG(mode):
+        return 'file'
+    return None
+
+
+def _path_kinds(paths):
+    """Classify several paths at once.
+
+    Paths sharing a parent directory are resolved from a single scandir()
+    of that parent, reusing the d_type returned by getdents instead of
+    issuing one stat() per path.
+    """
+    by_parent = defaultdict(list)
+    for path in paths:
+        by_parent[_dirname(_normpath(path))].append(path)
+    
+    kinds = {}
+    for parent, children in by_parent.items():
+        if len(children) == 1:
+            kinds[children[0]] = _path_kind(children[0])
+            continue
+        
+        try:
+            with os.scandir(parent or '.') as it:
+                entries = {entry.name: entry for entry in it}
+        except OSError:
+            for child in children:
+                kinds[child] = _path_kind(child)
+            continue
+        
+        for child in children:
+            entry = entries.get(_basename(_normpath(child)))
+            kind = None
+            if entry is not None:
+                try:
+                    if entry.is_dir():
+                        kind = 'dir'
+                    elif entry.is_file():
+                        kind = 'file'
+                except OSError:
+                    pass
+            kinds[child] = kind
+    return kinds
+
+
+@contextlib.contextmanager
+def _coalesced_log_output(log):
+    """Buffer everything written by log's stream handlers and emit it in
+    one write() per stream on exit, instead of one write+flush per record.
+    Output format is unchanged.
+    """
+    handlers = []
+    current = log
+    while current:
+        handlers.extend(h for h in current.handlers if isinstance(h, logging.StreamHandler))
+        if not current.propagate:
+            break
+        current = current.parent
+    
+    swapped = [(h, io.StringIO()) for h in handlers]
+    originals = [h.setStream(buf) for h, buf in swapped]
+    try:
+        yield
+    finally:
+        for (handler, buf), original in zip(swapped, originals):
+            handler.setStream(original)
+            original.write(buf.getvalue())
+            original.flush()
+
+
 class ConfigValidator:
     def __init__(self, config_path="config/system_config.json"):
         self.config_path = config_path
         self.config = None
+        self._config_stat = None
+        self._project_root = _DEFAULT_PROJECT_ROOT
         self.errors = []
         self.warnings = []
         
     def load_config(self):
-        """Load and parse the configuration file."""
+        """Load and parse the configuration file.
+        
+        Parsing goes through config_loader, whose snapshot cache lets an
+        unchanged file skip the JSON parse.
+        """
         try:
-            with open(self.config_path, 'r') as f:
-                self.config = json.load(f)
+            self._config_stat = os.stat(self.config_path)
+            self.config = load_config(self.config_path, self._config_stat.st_mtime_ns)
+            self._project_root = self.config.get('paths', {}).get('project_root', _DEFAULT_PROJECT_ROOT)
             logger.info(f"✓ Loaded configuration from {self.config_path}")
             return True
         except FileNotFoundError:
             self.errors.append(f"Configuration file not found: {self.config_path}")
             return False
-        except json.JSONDecodeError as e:
+        except ValueError as e:
+            # orjson.JSONDecodeError and json.JSONDecodeError both subclass ValueError
             self.errors.append(f"Invalid JSON in configuration: {e}")
             return False
     
@@ -38,36 +153,29 @@ class ConfigValidator:
         """Resolve path variables like ${project_root}."""
         if not path_str:
             return path_str
-            
-        # Get project root from config or use default
-        project_root = self.config.get('paths', {}).get('project_root', 
-                                                        os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        
-        # Replace variables
-        resolved = path_str.replace('${project_root}', project_root)
-        resolved = os.path.expanduser(resolved)
-        resolved = os.path.expandvars(resolved)
         
-        return resolved
+        return _resolve_path(path_str, self._project_root)
     
     def validate_paths(self):
         """Validate all path configurations."""
+        result = _SectionResult([], [], [])
+        
         if 'paths' not in self.config:
-            self.warnings.append("No 'paths' section in configuration")
-            return
+            result.warnings.append("No 'paths' section in configuration")
+            return result
         
         paths = self.config['paths']
         
         # Validate project root
         project_root = paths.get('project_root')
         if not project_root:
-            self.errors.append("Missing 'paths.project_root' in configuration")
-            return
+            result.errors.append("Missing 'paths.project_root' in configuration")
+            return result
         
-        if not os.path.isdir(project_root):
-            self.errors.append(f"Project root directory does not exist: {project_root}")
+        if _path_kind(project_root) != 'dir':
+            result.errors.append(f"Project root directory does not exist: {project_root}")
         else:
-            logger.info(f"✓ Project root: {project_root}")
+            result.infos.append(f"✓ Project root: {project_root}")
         
         # Validate other paths
         path_checks = {
@@ -77,36 +185,46 @@ class ConfigValidator:
             'apparmor_profiles': ('directory', True)  # Optional
         }
         
+        resolved = {}
         for path_key, (path_type, optional) in path_checks.items():
             if path_key not in paths:
                 if not optional:
-                    self.errors.append(f"Missing required path: paths.{path_key}")
+                    result.errors.append(f"Missing required path: paths.{path_key}")
                 continue
-            
-            resolved_path = self.resolve_path(paths[path_key])
-            
+            resolved[path_key] = self.resolve_path(paths[path_key])
+        
+        # Siblings under ${project_root} are checked with one scandir per parent
+        kinds = _path_kinds(resolved.values())
+        
+        for path_key, resolved_path in resolved.items():
+            path_type, optional = path_checks[path_key]
+            kind = kinds[resolved_path]
             if path_type == 'directory':
-                if not os.path.isdir(resolved_path):
+                if kind != 'dir':
                     if optional:
-                        self.warnings.append(f"Optional directory not found: {resolved_path}")
+                        result.warnings.append(f"Optional directory not found: {resolved_path}")
                     else:
-                        self.errors.append(f"Required directory not found: {resolved_path}")
+                        result.errors.append(f"Required directory not found: {resolved_path}")
                 else:
-                    logger.info(f"✓ {path_key}: {resolved_path}")
+                    result.infos.append(f"✓ {path_key}: {resolved_path}")
             elif path_type == 'file':
-                if not os.path.isfile(resolved_path):
+                if kind != 'file':
                     if optional:
-                        self.warnings.append(f"Optional file not found: {resolved_path}")
+                        result.warnings.append(f"Optional file not found: {resolved_path}")
                     else:
-                        self.errors.append(f"Required file not found: {resolved_path}")
+                        result.errors.append(f"Required file not found: {resolved_path}")
                 else:
-                    logger.info(f"✓ {path_key}: {resolved_path}")
+                    result.infos.append(f"✓ {path_key}: {resolved_path}")
+        
+        return result
     
     def validate_vpn(self):
         """Validate VPN configuration."""
+        result = _SectionResult([], [], [])
+        
         if 'vpn' not in self.config:
-            self.errors.append("Missing 'vpn' section in configuration")
-            return
+            result.errors.append("Missing 'vpn' section in configuration")
+            return result
         
         vpn = self.config['vpn']
         
@@ -114,68 +232,88 @@ class ConfigValidator:
         required_fields = ['interface', 'config_path']
         for field in required_fields:
             if field not in vpn:
-                self.errors.append(f"Missing required VPN field: vpn.{field}")
+                result.errors.append(f"Missing required VPN field: vpn.{field}")
         
         # Check if VPN config file exists
         if 'config_path' in vpn:
             vpn_config = vpn['config_path']
-            if not os.path.isfile(vpn_config):
-                self.errors.append(f"VPN configuration file not found: {vpn_config}")
+            if _path_kind(vpn_config) != 'file':
+                result.errors.append(f"VPN configuration file not found: {vpn_config}")
             else:
-                logger.info(f"✓ VPN config: {vpn_config}")
+                result.infos.append(f"✓ VPN config: {vpn_config}")
+        
+        return result
     
     def validate_browser(self):
         """Validate browser configuration."""
+        result = _SectionResult([], [], [])
+        
         if 'kiosk' not in self.config:
-            self.errors.append("Missing 'kiosk' section in configuration")
-            return
+            result.errors.append("Missing 'kiosk' section in configuration")
+            return result
         
         kiosk = self.config['kiosk']
         
         # Check browser path
         browser_path = kiosk.get('browser_path')
         if not browser_path:
-            self.warnings.append("No browser_path specified, will try to find browser automatically")
-        elif not os.path.isfile(browser_path):
-            self.errors.append(f"Browser executable not found: {browser_path}")
+            result.warnings.append("No browser_path specified, will try to find browser automatically")
+        elif _path_kind(browser_path) != 'file':
+            result.errors.append(f"Browser executable not found: {browser_path}")
         else:
-            logger.info(f"✓ Browser: {browser_path}")
+            result.infos.append(f"✓ Browser: {browser_path}")
+        
+        return result
     
     def validate_network(self):
         """Validate network configuration."""
+        result = _SectionResult([], [], [])
+        
         if 'network' not in self.config:
-            self.errors.append("Missing 'network' section in configuration")
-            return
+            result.errors.append("Missing 'network' section in configuration")
+            return result
         
         network = self.config['network']
         
         # Check allowed domains
         if 'allowed_domains' not in network or not network['allowed_domains']:
-            self.errors.append("No allowed domains configured")
+            result.errors.append("No allowed domains configured")
         else:
-            logger.info(f"✓ Allowed domains: {len(network['allowed_domains'])} configured")
+            result.infos.append(f"✓ Allowed domains: {len(network['allowed_domains'])} configured")
+        
+        return result
     
     def validate_permissions(self):
         """Check file permissions on critical files."""
+        result = _SectionResult([], [], [])
+        
         if not self.config:
-            return
+            return result
         
         # Check if running as root (required for production)
         if self.config.get('mode') == 'production' and os.geteuid() != 0:
-            self.warnings.append("Production mode requires root privileges")
+            result.warnings.append("Production mode requires root privileges")
         
         # Check log directory permissions
         log_dir = self.config.get('logging', {}).get('log_dir') or \
                   self.resolve_path(self.config.get('paths', {}).get('log_dir', '/var/log/secure-exam'))
         
-        if os.path.exists(log_dir):
-            if not os.access(log_dir, os.W_OK):
-                self.errors.append(f"Log directory is not writable: {log_dir}")
-            else:
-                logger.info(f"✓ Log directory writable: {log_dir}")
+        # access() answers the common (writable) case in one syscall; only
+        # fall back to stat() to tell "missing" apart from "not writable"
+        if os.access(log_dir, os.W_OK):
+            result.infos.append(f"✓ Log directory writable: {log_dir}")
+        elif _path_kind(log_dir) is not None:
+            result.errors.append(f"Log directory is not writable: {log_dir}")
+        
+        return result
     
     def validate(self):
         """Run all validations."""
+        with _coalesced_log_output(logger):
+            return self._validate()
+    
+    def _validate(self):
+        """Run all validations with log output already being buffered."""
         logger.info("=" * 60)
         logger.info("Configuration Validation")
         logger.info("=" * 60)
@@ -183,11 +321,18 @@ class ConfigValidator:
         if not self.load_config():
             return False
         
-        self.validate_paths()
-        self.validate_vpn()
-        self.validate_browser()
-        self.validate_network()
-        self.validate_permissions()
+        # Sections are independent and stat-bound, so run them concurrently;
+        # results are merged in a fixed order to keep the report stable
+        sections = (self.validate_paths, self.validate_vpn, self.validate_browser,
+                    self.validate_network, self.validate_permissions)
+        with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+            results = list(executor.map(lambda section: section(), sections))
+        
+        for result in results:
+            for message in result.infos:
+                logger.info(message)
+            self.errors.extend(result.errors)
+            self.warnings.extend(result.warnings)
         
         # Print summary
         logger.info("=" * 60)
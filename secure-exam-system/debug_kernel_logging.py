@@ -6,16 +6,30 @@ without relying on fragile shell scripts or missing auditd tools.
 """
 
 import os
+import re
 import sys
-import json
+import ctypes
+import platform
 import subprocess
 import time
 import logging
 
+from config_loader import load_config
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
 
+# klogctl(2) actions
+SYSLOG_ACTION_READ_ALL = 3
+SYSLOG_ACTION_SIZE_BUFFER = 10
+
+# finit_module(2) syscall numbers; other architectures fall back to insmod
+SYS_FINIT_MODULE = {'x86_64': 313, 'aarch64': 273}.get(platform.machine())
+
+# Kernel log keywords we care about, matched in one pass over raw bytes
+_KW_RE = re.compile(rb'EXAM_FILTER|IPTables|WireGuard|audit|EXECVE|proc_monitor|EXAM_DEBUG')
+
 def check_root():
     if os.geteuid() != 0:
         logger.error("❌ Must run as sudo")
@@ -26,11 +40,10 @@ def verify_config():
     config_path = "config/system_config.json"
     logger.info(f"Checking {config_path}...")
     try:
-        with open(config_path, 'r') as f:
-            json.load(f)
+        load_config(config_path)
         logger.info("✅ Config file is valid JSON")
         return True
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         logger.error(f"❌ Config file JSON Error: {e}")
         return False
     except Exception as e:
@@ -46,52 +59,89 @@ def load_kernel_module():
         logger.warning(f"⚠️ Kernel module not found at {ko_path}")
         return
 
-    # Check if loaded
-    result = subprocess.run(['lsmod'], capture_output=True, text=True)
-    if 'proc_monitor' in result.stdout:
+    # Check if loaded (lsmod is just a formatter over /proc/modules)
+    with open('/proc/modules', 'r') as f:
+        loaded = any(line.startswith('proc_monitor ') for line in f)
+    
+    if loaded:
         logger.info("✅ proc_monitor module is already loaded")
     else:
         logger.info("Loading proc_monitor module...")
-        res = subprocess.run(['insmod', ko_path], capture_output=True)
-        if res.returncode == 0:
+        error = insert_module(ko_path)
+        if error is None:
             logger.info("✅ Module loaded successfully")
         else:
-            logger.error(f"❌ Failed to load module: {res.stderr.decode()}")
+            logger.error(f"❌ Failed to load module: {error}")
+
+def insert_module(ko_path):
+    """Load a kernel module, returning None on success or an error string."""
+    if SYS_FINIT_MODULE is not None:
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        fd = os.open(ko_path, os.O_RDONLY)
+        try:
+            if libc.syscall(SYS_FINIT_MODULE, fd, b"", 0) == 0:
+                return None
+            return os.strerror(ctypes.get_errno())
+        finally:
+            os.close(fd)
+    
+    res = subprocess.run(['insmod', ko_path], capture_output=True)
+    if res.returncode == 0:
+        return None
+    return res.stderr.decode()
+
+def apply_iptables_rules(rules):
+    """Apply filter-table rules in one iptables-restore call (keeps existing rules)."""
+    blob = '*filter\n' + '\n'.join(rules) + '\nCOMMIT\n'
+    return subprocess.run(['iptables-restore', '--noflush'], input=blob.encode(), capture_output=True)
 
 def add_iptables_logging():
     """Add a temporary iptables rule to log outgoing traffic."""
     logger.info("\nAdding temporary iptables logging rule...")
     # Log new connections to 8.8.8.8
-    cmd = ['iptables', '-I', 'OUTPUT', '1', '-d', '8.8.8.8', '-p', 'icmp', '-j', 'LOG', '--log-prefix', 'EXAM_DEBUG: ']
-    subprocess.run(cmd, capture_output=True)
+    apply_iptables_rules(['-I OUTPUT 1 -d 8.8.8.8 -p icmp -j LOG --log-prefix "EXAM_DEBUG: "'])
     logger.info("✅ Logging rule added for 8.8.8.8 ICMP")
 
 def remove_iptables_logging():
     """Remove the temporary logging rule."""
     logger.info("Removing temporary logging rule...")
-    cmd = ['iptables', '-D', 'OUTPUT', '-d', '8.8.8.8', '-p', 'icmp', '-j', 'LOG', '--log-prefix', 'EXAM_DEBUG: ']
-    subprocess.run(cmd, capture_output=True)
+    apply_iptables_rules(['-D OUTPUT -d 8.8.8.8 -p icmp -j LOG --log-prefix "EXAM_DEBUG: "'])
     logger.info("✅ Logging rule removed")
 
+def read_kernel_log():
+    """Read the kernel ring buffer as raw bytes.
+    
+    Uses klogctl(2) directly to avoid forking dmesg; falls back to the
+    dmesg binary if the syscall is unavailable or not permitted.
+    """
+    try:
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        size = libc.klogctl(SYSLOG_ACTION_SIZE_BUFFER, None, 0)
+        if size > 0:
+            buf = ctypes.create_string_buffer(size)
+            n = libc.klogctl(SYSLOG_ACTION_READ_ALL, buf, size)
+            if n >= 0:
+                return buf.raw[:n]
+    except (OSError, AttributeError):
+        pass
+    
+    result = subprocess.run(['dmesg'], capture_output=True)
+    return result.stdout
+
 def check_dmesg_logs():
     """Check dmesg for relevant logs."""
     logger.info("\nChecking kernel logs (dmesg)...")
     
-    # Keywords to look for
-    keywords = ["EXAM_FILTER", "IPTables", "WireGuard", "audit", "EXECVE", "proc_monitor", "EXAM_DEBUG"]
-    
     found_any = False
     try:
-        # Get last 100 lines of dmesg
-        result = subprocess.run(['dmesg'], capture_output=True, text=True)
-        lines = result.stdout.splitlines()[-100:]
+        # Last 100 lines only; rsplit stops after scanning them from the end.
+        # Lines stay as bytes and only matches are decoded for output.
+        lines = read_kernel_log().rstrip(b'\n').rsplit(b'\n', 100)[-100:]
         
         for line in lines:
-            for kw in keywords:
-                if kw in line:
-                    logger.info(f"  Found log: {line.strip()}")
-                    found_any = True
-                    break
+            if _KW_RE.search(line):
+                logger.info(f"  Found log: {line.strip().decode(errors='replace')}")
+                found_any = True
         
         if not found_any:
             logger.warning("  No recent relevant kernel logs found.")
@@ -4,25 +4,24 @@ Main Controller
 Orchestrates all secure exam system components.
 """
 
+import os
 import sys
+import importlib
 import json
 import logging
 import signal
+import stat
+import tempfile
 import time
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 
+_PKG_ROOT = os.path.dirname(os.path.abspath(__file__))
+
 # Add project root to path
-sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, _PKG_ROOT)
 
-from network.vpn_manager import VPNManager
-from network.domain_filter import DomainFilter
-from network.kiosk_browser import KioskBrowser
-from network.network_monitor import NetworkMonitor
-from process_manager.process_enforcer import ProcessEnforcer
-from security.system_lockdown import SystemLockdown
-from security.integrity_checker import IntegrityChecker
-from security.security_patcher import SecurityPatcher
+from config_loader import load_config
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,41 +30,138 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Pre-flight results are reused across restarts for this long (seconds),
+# as long as the integrity baseline and process allowlist are unchanged.
+# /run is root-only tmpfs, so the record never outlives the boot.
+PREFLIGHT_CACHE_PATH = '/run/secure-exam/preflight.json'
+PREFLIGHT_CACHE_TTL = 5.0
+
+
+def _stat_key(path):
+    """Identity of a file's current contents, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def _read_preflight_cache(key):
+    """Return the cached pre-flight result for key, or None.
+    
+    Only a record we wrote ourselves is trusted: a planted one could
+    report checks as passed.
+    """
+    try:
+        fd = os.open(PREFLIGHT_CACHE_PATH, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return None
+    with os.fdopen(fd, 'rb') as f:
+        st = os.fstat(fd)
+        if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return None
+        try:
+            record = json.load(f)
+            cached_key, cached_at, result = record['key'], record['at'], record['result']
+        except (ValueError, KeyError, TypeError):
+            return None
+    # CLOCK_MONOTONIC is system-wide, so ages compare across processes
+    if cached_key != key or not 0 <= time.monotonic() - cached_at < PREFLIGHT_CACHE_TTL:
+        return None
+    return result
+
+
+def _write_preflight_cache(key, result):
+    """Atomically replace the record; failures only cost the next start."""
+    cache_dir = os.path.dirname(PREFLIGHT_CACHE_PATH)
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.preflight.')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'key': key, 'at': time.monotonic(), 'result': result}, f)
+        os.replace(tmp_path, PREFLIGHT_CACHE_PATH)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def _lazy_component(module_name, class_name):
+    """Property that imports and builds a component on first access.
+    
+    Keeps the heavy network/process/security modules out of startup for
+    code paths (such as --dry-run) that never touch them.
+    """
+    def getter(self):
+        component = self._components.get(class_name)
+        if component is None:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            component = self._components[class_name] = cls(config=self.config)
+        return component
+    return property(getter)
+
 
 class MainController:
+    vpn = _lazy_component('network.vpn_manager', 'VPNManager')
+    domain_filter = _lazy_component('network.domain_filter', 'DomainFilter')
+    kiosk = _lazy_component('network.kiosk_browser', 'KioskBrowser')
+    network_monitor = _lazy_component('network.network_monitor', 'NetworkMonitor')
+    process_enforcer = _lazy_component('process_manager.process_enforcer', 'ProcessEnforcer')
+    lockdown = _lazy_component('security.system_lockdown', 'SystemLockdown')
+    integrity = _lazy_component('security.integrity_checker', 'IntegrityChecker')
+    patcher = _lazy_component('security.security_patcher', 'SecurityPatcher')
+    
     def __init__(self, config_path="config/system_config.json"):
         """Initialize main controller."""
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+        self.config = load_config(config_path)
         
         self.mode = self.config['mode']
         
-        # Initialize all components
-        self.vpn = VPNManager(config_path)
-        self.domain_filter = DomainFilter(config_path)
-        self.kiosk = KioskBrowser(config_path)
-        self.network_monitor = NetworkMonitor(config_path)
-        self.process_enforcer = ProcessEnforcer(config_path)
-        self.lockdown = SystemLockdown(config_path)
-        self.integrity = IntegrityChecker(config_path)
-        self.patcher = SecurityPatcher()
+        # Components are built on first access from the already-parsed config
+        self._components = {}
         
         self.running = False
         
-        # Register signal handlers
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
-        
         logger.info(f"Main Controller initialized in {self.mode} mode")
     
+    def _build_runtime(self):
+        """Build every component before the system is modified.
+        
+        A broken component then fails start() up front instead of leaving
+        the machine half locked down.
+        """
+        for name in ('vpn', 'domain_filter', 'network_monitor', 'process_enforcer',
+                     'patcher', 'lockdown', 'integrity', 'kiosk'):
+            getattr(self, name)
+    
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals."""
         logger.warning(f"Received signal {signum}, shutting down...")
         self.stop()
         sys.exit(0)
     
+    def _preflight_key(self):
+        """Stat of the files the pre-flight checks read, plus the mode."""
+        return [self.mode,
+                _stat_key(self.integrity.integrity_file),
+                _stat_key(self.process_enforcer.allowlist.allowlist_file)]
+    
     def pre_flight_checks(self) -> bool:
-        """Run pre-flight checks before starting."""
+        """Run pre-flight checks before starting.
+        
+        The result is recorded in PREFLIGHT_CACHE_PATH and reused for
+        PREFLIGHT_CACHE_TTL seconds, by this or a restarted controller, as
+        long as the integrity baseline and process allowlist are unchanged.
+        """
+        cached_result = _read_preflight_cache(self._preflight_key())
+        if cached_result is not None:
+            logger.info("Using cached pre-flight check results")
+            return cached_result
+        
         logger.info("Running pre-flight checks...")
         
         checks = []
@@ -76,12 +172,13 @@ class MainController:
             self.integrity.baseline_system()
         
         # Check 2: Process allowlist exists
-        if not self.process_enforcer.allowlist.get_processes():
+        processes = self.process_enforcer.allowlist.get_processes()
+        if not processes:
             logger.error("Process allowlist is empty!")
             logger.error("Run: python3 process_manager/allowlist_builder.py")
             checks.append(False)
         else:
-            logger.info(f"✓ Process allowlist loaded ({len(self.process_enforcer.allowlist.get_processes())} processes)")
+            logger.info(f"✓ Process allowlist loaded ({len(processes)} processes)")
             checks.append(True)
         
         # Check 3: VPN config exists (if not testing)
@@ -101,14 +198,12 @@ class MainController:
         else:
             logger.error("✗ Some pre-flight checks failed")
         
+        # Keyed after the checks, which may have just created the baseline
+        _write_preflight_cache(self._preflight_key(), all_passed)
         return all_passed
     
-    def start_network_security(self) -> bool:
-        """Start network security components."""
-        logger.info("\n" + "="*60)
-        logger.info("STARTING NETWORK SECURITY")
-        logger.info("="*60)
-        
+    def _start_vpn_and_filter(self) -> bool:
+        """Start the VPN, then the domain filter that depends on it."""
         # Start VPN
         logger.info("1. Starting VPN...")
         if not self.vpn.start():
@@ -122,13 +217,30 @@ class MainController:
             logger.error("Failed to start domain filter")
             return False
         logger.info("✓ Domain filter started")
-        
-        # Start network monitor
+        return True
+    
+    def _start_network_monitor(self) -> bool:
+        """Start the network monitor."""
         logger.info("3. Starting network monitor...")
         if not self.network_monitor.start():
             logger.error("Failed to start network monitor")
             return False
         logger.info("✓ Network monitor started")
+        return True
+    
+    def start_network_security(self) -> bool:
+        """Start network security components."""
+        logger.info("\n" + "="*60)
+        logger.info("STARTING NETWORK SECURITY")
+        logger.info("="*60)
+        
+        # The domain filter installs its rules inside the VPN namespace after
+        # the kill switch has flushed iptables, and the monitor watches the
+        # tunnel and namespace they create: everything starts in order
+        if not self._start_vpn_and_filter():
+            return False
+        if not self._start_network_monitor():
+            return False
         
         logger.info("✓ Network security active")
         return True
@@ -207,6 +319,8 @@ class MainController:
         logger.info("SECURE EXAM SYSTEM - STARTING")
         logger.info("#"*60)
         
+        self._build_runtime()
+        
         # Pre-flight checks
         if not self.pre_flight_checks():
             logger.error("Pre-flight checks failed, aborting")
@@ -260,9 +374,13 @@ class MainController:
         self.process_enforcer.stop()
         
         logger.info("4. Stopping network security...")
-        self.network_monitor.stop()
-        self.domain_filter.stop()
-        self.vpn.stop()
+        # Filter chains live in the VPN namespace, so tear them down before
+        # the VPN; the monitor thread join runs concurrently with both.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            monitor = executor.submit(self.network_monitor.stop)
+            chain = executor.submit(lambda: (self.domain_filter.stop(), self.vpn.stop()))
+            monitor.result()
+            chain.result()
         
         self.running = False
         
@@ -271,6 +389,10 @@ class MainController:
     
     def run(self):
         """Run the exam system until stopped."""
+        # Signals only matter once the system is actually running
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+        
         if not self.start():
             logger.error("Failed to start exam system")
             return 1
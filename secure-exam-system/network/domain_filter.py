@@ -10,37 +10,85 @@ import subprocess
 import json
 import logging
 import socket
+import stat
+import tempfile
+import time
+import threading
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
 
 logger = logging.getLogger(__name__)
 
+# Resolved addresses are reused across restarts for this long (seconds)
+DNS_CACHE_TTL = 900
+
+# Root-only runtime state. Not /tmp: the security patcher empties /tmp
+# during start(), and anyone can create files there.
+RUN_DIR = '/run/secure-exam'
+DNS_CACHE_PATH = os.path.join(RUN_DIR, 'dns-cache.json')
+
+# Wait up to this many seconds for the xtables lock instead of failing outright
+# when another process is changing rules at the same time
+XTABLES_WAIT = '5'
+
+# Output of fire-and-forget commands is never read, so don't pipe it back
+_Q = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+
+# ipsets holding the resolved addresses, matched by a single rule per chain
+IPSET_V4 = 'exam_allowed_v4'
+IPSET_V6 = 'exam_allowed_v6'
+
+# Backup of the resolver config replaced in production DNS allowlist mode
+RESOLV_BACKUP_PATH = os.path.join(RUN_DIR, 'resolv.conf.backup')
+
+# unbound exits at once on a bad config or a busy port; give it this long
+# (seconds) to do so before the resolver is pointed at it
+UNBOUND_STARTUP_WAIT = 0.5
+
+# In-memory layer in front of the on-disk DNS cache, shared by all instances
+_dns_memo = {}
+
+
+def _safe_getaddrinfo(domain):
+    """Resolve a domain, returning None instead of raising on lookup failure."""
+    try:
+        # One STREAM record per address, and no AAAA/A lookup for families
+        # the host has no address configured for
+        return socket.getaddrinfo(domain, 443, type=socket.SOCK_STREAM,
+                                  flags=socket.AI_ADDRCONFIG)
+    except socket.gaierror as e:
+        logger.warning("Could not resolve %s: %s", domain, e)
+        return None
+
 
 class DomainFilter:
-    def __init__(self, config_path=None):
+    def __init__(self, config_path=None, config=None):
         """Initialize domain filter with configuration.
-        Handles possible stray characters (e.g., UTF‑8 BOM) before the JSON object.
+        Handles a possible UTF‑8 BOM before the JSON object.
         
         Args:
             config_path: Path to configuration file. If None, uses environment variable
                         EXAM_CONFIG or defaults to config/system_config.json
+            config: Already-parsed configuration dict, skips re-reading the file
         """
-        if config_path is None:
-            # Try environment variable first
-            config_path = os.environ.get('EXAM_CONFIG')
+        if config is None:
             if config_path is None:
-                # Default to relative path from project root
-                script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                config_path = os.path.join(script_dir, 'config', 'system_config.json')
-        
-        # Read the file as raw text
-        with open(config_path, 'r', encoding='utf-8') as f:
-            raw = f.read()
-        # Find the first '{' which marks the start of the JSON object
-        json_start = raw.find('{')
-        if json_start == -1:
-            raise ValueError('Configuration file does not contain a JSON object')
-        # Load JSON from that point onward
-        self.config = json.loads(raw[json_start:])
+                # Try environment variable first
+                config_path = os.environ.get('EXAM_CONFIG')
+                if config_path is None:
+                    # Default to relative path from project root
+                    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                    config_path = os.path.join(script_dir, 'config', 'system_config.json')
+            
+            config = load_config(config_path)
+        self.config = config
         
         self.mode = self.config['mode']
         self.network_config = self.config['network']
@@ -52,40 +100,180 @@ class DomainFilter:
         # Resolve allowed IPs from domains - separate IPv4 and IPv6
         self.allowed_ips_v4 = set()
         self.allowed_ips_v6 = set()
+        self._dns_cache_path = DNS_CACHE_PATH
+        # Let a local unbound answer only for allowed domains and fill the ipsets
+        self.use_dns_allowlist = self.network_config.get('use_dns_allowlist', False)
+        self._unbound = None
+        self._unbound_conf = None
+        self._resolver_redirected = False
+        self._ns_exec = ['ip', 'netns', 'exec', self.namespace] if self.is_testing else []
         
-        logger.info(f"Domain Filter initialized in {self.mode} mode")
-        logger.info(f"Allowed domains: {self.allowed_domains}")
+        # Background DNS refresh keeps rules current during long sessions
+        self._lock = threading.Lock()
+        self._stop_refresh = threading.Event()
+        self._refresh_thread = None
+        
+        logger.info("Domain Filter initialized in %s mode", self.mode)
+        logger.info("Allowed domains: %s", self.allowed_domains)
     
-    def resolve_allowed_ips(self):
-        """Resolve IP addresses for allowed domains."""
-        logger.info("Resolving IP addresses for allowed domains...")
+    def _load_dns_cache(self):
+        """Load the on-disk DNS cache, ignoring files we did not write ourselves."""
+        try:
+            with open(self._dns_cache_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                # Never trust a cache another user could have planted
+                if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                    return {}
+                cache = json.loads(f.read())
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_dns_cache(self, cache):
+        """Atomically write the DNS cache so readers never see a partial file."""
+        cache_dir = os.path.dirname(self._dns_cache_path)
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.dns-cache.')
+        except OSError as e:
+            logger.warning("Could not write DNS cache: %s", e)
+            return
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self._dns_cache_path)
+        except OSError as e:
+            logger.warning("Could not write DNS cache: %s", e)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    
+    def _lookup_allowed_ips(self):
+        """Look up addresses for all non-wildcard allowed domains.
+        
+        Results are cached in memory and on disk for DNS_CACHE_TTL seconds,
+        so a restart only pays the DNS round trip for expired domains.
         
+        Returns:
+            Tuple of (ipv4 set, ipv6 set)
+        """
         domains_to_resolve = []
         for domain in self.allowed_domains:
             if '*' not in domain:  # Skip wildcard domains
                 domains_to_resolve.append(domain)
         
+        allowed_v4 = set()
+        allowed_v6 = set()
+        now = time.time()
+        if not all(domain in _dns_memo for domain in domains_to_resolve):
+            for domain, entry in self._load_dns_cache().items():
+                if domain not in _dns_memo:
+                    _dns_memo[domain] = entry
+        misses = []
+        
         for domain in domains_to_resolve:
+            entry = _dns_memo.get(domain)
             try:
-                 # Resolve domain to IPs
-                ips = socket.getaddrinfo(domain, None)
-                for ip_info in ips:
-                    ip = ip_info[4][0]
-                    family = ip_info[0]
-                    
-                    # Separate IPv4 and IPv6
-                    if family == socket.AF_INET:
-                        self.allowed_ips_v4.add(ip)
-                        logger.info(f"  {domain} -> {ip} (IPv4)")
-                    elif family == socket.AF_INET6:
-                        self.allowed_ips_v6.add(ip)
-                        logger.info(f"  {domain} -> {ip} (IPv6)")
-            except socket.gaierror as e:
-                logger.warning(f"Could not resolve {domain}: {e}")
-        
-        logger.info(f"Resolved {len(self.allowed_ips_v4)} IPv4 and {len(self.allowed_ips_v6)} IPv6 addresses")
+                if entry['ts'] + entry['ttl'] > now:
+                    allowed_v4.update(entry['v4'])
+                    allowed_v6.update(entry['v6'])
+                    logger.info("  %s -> %d IPv4, %d IPv6 (cached)", domain, len(entry['v4']), len(entry['v6']))
+                    continue
+            except (TypeError, KeyError):
+                pass  # Missing or malformed entry, resolve it again
+            misses.append(domain)
+        
+        # Lookups are blocking network I/O, so overlap them: max RTT instead of sum
+        results = []
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(16, len(misses))) as ex:
+                results = list(ex.map(lambda d: (d, _safe_getaddrinfo(d)), misses))
+        
+        cache_dirty = False
+        af_inet, af_inet6 = socket.AF_INET, socket.AF_INET6
+        log_info = logger.isEnabledFor(logging.INFO)
+        for domain, ips in results:
+            if ips is None:
+                # Keep serving the expired entry rather than dropping the domain
+                entry = _dns_memo.get(domain)
+                if isinstance(entry, dict):
+                    allowed_v4.update(entry.get('v4', ()))
+                    allowed_v6.update(entry.get('v6', ()))
+                continue
+            
+            # Separate IPv4 and IPv6
+            v4 = {ip_info[4][0] for ip_info in ips if ip_info[0] == af_inet}
+            v6 = {ip_info[4][0] for ip_info in ips if ip_info[0] == af_inet6}
+            if log_info:
+                for ip in v4:
+                    logger.info("  %s -> %s (IPv4)", domain, ip)
+                for ip in v6:
+                    logger.info("  %s -> %s (IPv6)", domain, ip)
+            allowed_v4 |= v4
+            allowed_v6 |= v6
+            _dns_memo[domain] = {'v4': sorted(v4), 'v6': sorted(v6),
+                                 'ts': now, 'ttl': DNS_CACHE_TTL}
+            cache_dirty = True
+        
+        if cache_dirty:
+            self._save_dns_cache(_dns_memo)
+        
+        return allowed_v4, allowed_v6
+    
+    def resolve_allowed_ips(self):
+        """Resolve IP addresses for allowed domains."""
+        logger.info("Resolving IP addresses for allowed domains...")
+        
+        allowed_v4, allowed_v6 = self._lookup_allowed_ips()
+        with self._lock:
+            self.allowed_ips_v4 |= allowed_v4
+            self.allowed_ips_v6 |= allowed_v6
+        
+        logger.info("Resolved %d IPv4 and %d IPv6 addresses", len(self.allowed_ips_v4), len(self.allowed_ips_v6))
         return True
     
+    def refresh_allowed_ips(self):
+        """Re-resolve allowed domains and patch the filter chains with any changes."""
+        allowed_v4, allowed_v6 = self._lookup_allowed_ips()
+        if not allowed_v4 and not allowed_v6:
+            logger.warning("DNS refresh returned no addresses, keeping current rules")
+            return False
+        
+        with self._lock:
+            for set_name, current, fresh in (
+                    (IPSET_V4, self.allowed_ips_v4, allowed_v4),
+                    (IPSET_V6, self.allowed_ips_v6, allowed_v6)):
+                added = fresh - current
+                removed = current - fresh
+                if not added and not removed:
+                    continue
+                if set_name == IPSET_V6 and not current:
+                    # The IPv6 chain is only created when there was something to allow
+                    continue
+                
+                # Only the set changes, the chain itself is left untouched
+                entries = [f'add {set_name} {ip} -exist' for ip in added]
+                entries.extend(f'del {set_name} {ip} -exist' for ip in removed)
+                try:
+                    self._restore_ipset(self._ns_exec, entries)
+                except subprocess.CalledProcessError as e:
+                    logger.error("Failed to update %s: %s", set_name, e.stderr.decode())
+                    continue
+                
+                current |= added
+                current -= removed
+                logger.info("DNS refresh updated %s: +%d -%d addresses", set_name, len(added), len(removed))
+        return True
+    
+    def _refresh_loop(self):
+        """Periodically refresh allowed addresses until stop() is called."""
+        while not self._stop_refresh.wait(DNS_CACHE_TTL):
+            try:
+                self.refresh_allowed_ips()
+            except Exception as e:
+                logger.error("DNS refresh failed: %s", e)
+    
     def backup_iptables(self):
         """Backup current iptables rules (production mode only)."""
         if self.is_testing:
@@ -94,23 +282,21 @@ class DomainFilter:
         try:
             logger.info("Backing up current iptables rules...")
             
-            # Backup IPv4 rules
-            result = subprocess.run(['iptables-save'], capture_output=True, text=True)
-            if result.returncode == 0:
-                with open('/tmp/exam-iptables-backup.rules', 'w') as f:
-                    f.write(result.stdout)
-                logger.info("  IPv4 rules backed up")
-            
-            # Backup IPv6 rules
-            result = subprocess.run(['ip6tables-save'], capture_output=True, text=True)
-            if result.returncode == 0:
-                with open('/tmp/exam-ip6tables-backup.rules', 'w') as f:
-                    f.write(result.stdout)
-                logger.info("  IPv6 rules backed up")
+            # Stream the dumps straight into the backup files, no Python-side copy
+            for save_cmd, backup_path, label in (
+                    ('iptables-save', '/tmp/exam-iptables-backup.rules', 'IPv4'),
+                    ('ip6tables-save', '/tmp/exam-ip6tables-backup.rules', 'IPv6')):
+                with open(backup_path, 'wb') as f:
+                    result = subprocess.run([save_cmd], stdout=f, stderr=subprocess.DEVNULL)
+                if result.returncode == 0:
+                    logger.info("  %s rules backed up", label)
+                else:
+                    # Don't leave a partial dump behind for restore_iptables to load
+                    os.remove(backup_path)
             
             return True
         except Exception as e:
-            logger.error(f"Failed to backup iptables: {str(e)}")
+            logger.error("Failed to backup iptables: %s", e)
             return False
     
     def restore_iptables(self):
@@ -124,27 +310,85 @@ class DomainFilter:
             # Restore IPv4 rules
             if os.path.exists('/tmp/exam-iptables-backup.rules'):
                 with open('/tmp/exam-iptables-backup.rules', 'r') as f:
-                    subprocess.run(['iptables-restore'], stdin=f, check=True)
+                    subprocess.run(['iptables-restore', '-w', XTABLES_WAIT], stdin=f, check=True)
                 logger.info("  IPv4 rules restored")
                 os.remove('/tmp/exam-iptables-backup.rules')
             
             # Restore IPv6 rules
             if os.path.exists('/tmp/exam-ip6tables-backup.rules'):
                 with open('/tmp/exam-ip6tables-backup.rules', 'r') as f:
-                    subprocess.run(['ip6tables-restore'], stdin=f, check=True)
+                    subprocess.run(['ip6tables-restore', '-w', XTABLES_WAIT], stdin=f, check=True)
                 logger.info("  IPv6 rules restored")
                 os.remove('/tmp/exam-ip6tables-backup.rules')
             
             return True
         except Exception as e:
-            logger.error(f"Failed to restore iptables: {str(e)}")
+            logger.error("Failed to restore iptables: %s", e)
             return False
     
+    def _restore_ipset(self, ns_exec, entries):
+        """Apply ipset commands with a single `ipset restore` call."""
+        blob = '\n'.join(entries) + '\n'
+        subprocess.run(ns_exec + ['ipset', 'restore'], input=blob.encode(),
+                      check=True, capture_output=True)
+    
+    def _load_ipset(self, ns_exec, set_name, family, allowed_ips):
+        """Create (or empty) a hash:ip set and fill it with the allowed addresses."""
+        entries = [f'create {set_name} hash:ip family {family} -exist',
+                   f'flush {set_name}']
+        entries.extend(f'add {set_name} {ip} -exist' for ip in allowed_ips)
+        self._restore_ipset(ns_exec, entries)
+    
+    def _filter_chain_rules(self, chain, set_name):
+        """Build iptables-restore lines for an allow-only filter chain."""
+        rules = [
+            # Declaring the chain creates it (or flushes it under --noflush)
+            f':{chain} - [0:0]',
+            # CRITICAL SAFEGUARDS (prevent total lockout)
+            # 1. Allow localhost ALWAYS
+            f'-A {chain} -o lo -j ACCEPT',
+            # 2. Allow established connections (prevents breaking chat, SSH, etc.)
+            f'-A {chain} -m state --state ESTABLISHED,RELATED -j ACCEPT',
+            # 3. Allow DNS queries (port 53)
+            f'-A {chain} -p udp --dport 53 -j ACCEPT',
+            f'-A {chain} -p tcp --dport 53 -j ACCEPT',
+        ]
+        
+        # Allow traffic to resolved addresses (HTTP/HTTPS), one hash lookup per packet
+        rules.append(f'-A {chain} -m set --match-set {set_name} dst -j ACCEPT')
+        
+        # Drop everything else, then hook the chain in at the top of OUTPUT
+        rules.append(f'-A {chain} -j DROP')
+        rules.append(f'-I OUTPUT 1 -j {chain}')
+        return rules
+    
+    def _apply_rules(self, ns_exec, restore_cmd, rules):
+        """Load rules into the filter table with a single *-restore call."""
+        blob = '*filter\n' + '\n'.join(rules) + '\nCOMMIT\n'
+        subprocess.run(ns_exec + [restore_cmd, '-w', XTABLES_WAIT, '-n'], input=blob.encode(),
+                      check=True, capture_output=True)
+    
+    def _remove_chain(self, ns_exec, chain, iptables_cmd, restore_cmd):
+        """Unhook, flush and delete a filter chain, in one restore call when possible."""
+        try:
+            self._apply_rules(ns_exec, restore_cmd,
+                              [f'-D OUTPUT -j {chain}', f'-F {chain}', f'-X {chain}'])
+            return
+        except subprocess.CalledProcessError:
+            # The batch is all-or-nothing; a partially installed chain
+            # (or none at all) needs the step-by-step best-effort path
+            pass
+        for action in (['-D', 'OUTPUT', '-j', chain], ['-F', chain], ['-X', chain]):
+            subprocess.run(ns_exec + [iptables_cmd, '-w', XTABLES_WAIT] + action, **_Q)
+    
     def configure_iptables_filtering(self):
         """
         Configure iptables to allow ONLY codeforces.com IPs.
         Handles IPv4 and IPv6 separately.
         This works inside the VPN tunnel after traffic is decrypted.
+        
+        Allowed addresses live in an ipset matched by one rule, so neither
+        setup nor per-packet matching grows with the number of allowed IPs.
         """
         try:
             if self.is_testing:
@@ -155,114 +399,217 @@ class DomainFilter:
                 self.backup_iptables()
             
             logger.info("Configuring iptables domain filtering...")
+            # Per-address logging is skipped entirely when INFO is off
+            log_info = logger.isEnabledFor(logging.INFO)
             
             # ===== IPv4 FILTERING =====
             
-            # Create new chain for domain filtering (IPv4)
-            subprocess.run(ns_exec + ['iptables', '-N', 'EXAM_FILTER'], 
-                          capture_output=True)
-            
-            # CRITICAL SAFEGUARDS (prevent total lockout)
-            # 1. Allow localhost ALWAYS
-            subprocess.run(ns_exec + ['iptables', '-A', 'EXAM_FILTER', 
-                          '-o', 'lo', '-j', 'ACCEPT'],
-                          capture_output=True)
-            
-            # 2. Allow established connections (prevents breaking chat, SSH, etc.)
-            subprocess.run(ns_exec + ['iptables', '-A', 'EXAM_FILTER',
-                          '-m', 'state', '--state', 'ESTABLISHED,RELATED', '-j', 'ACCEPT'],
-                          capture_output=True)
-            
-            # 3. Allow DNS queries (port 53) - IPv4
-            subprocess.run(ns_exec + ['iptables', '-A', 'EXAM_FILTER', 
-                                     '-p', 'udp', '--dport', '53', '-j', 'ACCEPT'],
-                          capture_output=True)
-            subprocess.run(ns_exec + ['iptables', '-A', 'EXAM_FILTER', 
-                                     '-p', 'tcp', '--dport', '53', '-j', 'ACCEPT'],
-                          capture_output=True)
-            
-            # Allow traffic to resolved IPv4 addresses (HTTP/HTTPS)
-            for ip in self.allowed_ips_v4:
-                subprocess.run(ns_exec + ['iptables', '-A', 'EXAM_FILTER', 
-                              '-d', ip, '-j', 'ACCEPT'],
-                              capture_output=True)
-                logger.info(f"  Allowed IPv4: {ip}")
-            
-            # IMPORTANT: RETURN (not DROP) for non-matched packets
-            # This allows other rules to handle them
-            subprocess.run(ns_exec + ['iptables', '-A', 'EXAM_FILTER', 
-                          '-j', 'DROP'],
-                          capture_output=True)
-            
-            # Insert at beginning of OUTPUT chain
-            subprocess.run(ns_exec + ['iptables', '-I', 'OUTPUT', '1', 
-                          '-j', 'EXAM_FILTER'],
-                          capture_output=True)
-            
-            logger.info(f"IPv4 filtering configured ({len(self.allowed_ips_v4)} addresses)")
-            logger.info("SAFEGUARDS: localhost ✓, DNS ✓, established connections ✓")
+            self._load_ipset(ns_exec, IPSET_V4, 'inet', self.allowed_ips_v4)
+            self._apply_rules(ns_exec, 'iptables-restore',
+                              self._filter_chain_rules('EXAM_FILTER', IPSET_V4))
+            if log_info:
+                for ip in self.allowed_ips_v4:
+                    logger.info("  Allowed IPv4: %s", ip)
+                
+                logger.info("IPv4 filtering configured (%d addresses)", len(self.allowed_ips_v4))
+                logger.info("SAFEGUARDS: localhost ✓, DNS ✓, established connections ✓")
             
             # ===== IPv6 FILTERING =====
             
-            if len(self.allowed_ips_v6) > 0:
+            # In DNS allowlist mode the sets start empty and unbound fills both
+            if len(self.allowed_ips_v6) > 0 or self.use_dns_allowlist:
                 logger.info("Configuring IPv6 filtering...")
                 
-                # Create new chain for domain filtering (IPv6)
-                subprocess.run(ns_exec + ['ip6tables', '-N', 'EXAM_FILTER_V6'], 
-                              capture_output=True)
-                
-                # CRITICAL SAFEGUARDS (prevent total lockout)
-                # 1.Allow localhost
-                subprocess.run(ns_exec + ['ip6tables', '-A', 'EXAM_FILTER_V6',
-                              '-o', 'lo', '-j', 'ACCEPT'],
-                              capture_output=True)
-                
-                # 2. Allow established connections
-                subprocess.run(ns_exec + ['ip6tables', '-A', 'EXAM_FILTER_V6',
-                              '-m', 'state', '--state', 'ESTABLISHED,RELATED', '-j', 'ACCEPT'],
-                              capture_output=True)
-                
-                # 3. Allow DNS queries (port 53) - IPv6
-                subprocess.run(ns_exec + ['ip6tables', '-A', 'EXAM_FILTER_V6', 
-                                         '-p', 'udp', '--dport', '53', '-j', 'ACCEPT'],
-                              capture_output=True)
-                subprocess.run(ns_exec + ['ip6tables', '-A', 'EXAM_FILTER_V6', 
-                                         '-p', 'tcp', '--dport', '53', '-j', 'ACCEPT'],
-                              capture_output=True)
-                
-                # Allow traffic to resolved IPv6 addresses
-                for ip in self.allowed_ips_v6:
-                    subprocess.run(ns_exec + ['ip6tables', '-A', 'EXAM_FILTER_V6', 
-                                             '-d', ip, '-j', 'ACCEPT'],
-                                  capture_output=True)
-                    logger.info(f"  Allowed IPv6: {ip}")
-                
-                # Drop everything else (IPv6)
-                subprocess.run(ns_exec + ['ip6tables', '-A', 'EXAM_FILTER_V6', 
-                                         '-j', 'DROP'],
-                              capture_output=True)
-                
-                # Apply the filter chain to OUTPUT (IPv6)
-                subprocess.run(ns_exec + ['ip6tables', '-I', 'OUTPUT', '1', 
-                                         '-j', 'EXAM_FILTER_V6'],
-                              capture_output=True)
-                
-                logger.info(f"IPv6 filtering configured ({len(self.allowed_ips_v6)} addresses)")
-                logger.info("IPv6 SAFEGUARDS: localhost ✓, DNS ✓, established ✓")
+                self._load_ipset(ns_exec, IPSET_V6, 'inet6', self.allowed_ips_v6)
+                self._apply_rules(ns_exec, 'ip6tables-restore',
+                                  self._filter_chain_rules('EXAM_FILTER_V6', IPSET_V6))
+                if log_info:
+                    for ip in self.allowed_ips_v6:
+                        logger.info("  Allowed IPv6: %s", ip)
+                    
+                    logger.info("IPv6 filtering configured (%d addresses)", len(self.allowed_ips_v6))
+                    logger.info("IPv6 SAFEGUARDS: localhost ✓, DNS ✓, established ✓")
             else:
                 logger.info("No IPv6 addresses resolved, skipping IPv6 configuration")
             
             logger.info("Domain filtering configured successfully")
             return True
             
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to configure iptables: {e.stderr.decode()}")
+        except (subprocess.CalledProcessError, OSError) as e:
+            # OSError: a required tool (e.g. ipset) is not installed
+            stderr = getattr(e, 'stderr', None)
+            logger.error("Failed to configure iptables: %s", stderr.decode() if stderr else e)
             # In production mode, restore original rules if we fail
             if not self.is_testing:
                 logger.info("Attempting to restore original iptables rules due to error...")
                 self.restore_iptables()
             return False
     
+    def build_unbound_config(self):
+        """Build an unbound config that only resolves the allowed domains.
+        
+        Everything outside the allowed zones gets NXDOMAIN. Answers inside
+        them are added to the ipsets by unbound's ipset module, so the
+        filter tracks address changes without any resolution on our side.
+        """
+        zones = []
+        for domain in self.allowed_domains:
+            zone = domain.replace('*.', '').rstrip('.') + '.'
+            if zone not in zones:
+                zones.append(zone)
+        
+        lines = [
+            'server:',
+            '    interface: 127.0.0.1',
+            '    do-daemonize: no',
+            '    chroot: ""',
+            '    username: ""',
+            '    pidfile: ""',
+            '    use-syslog: no',
+            '    module-config: "ipset iterator"',
+            '    local-zone: "." always_nxdomain',
+        ]
+        lines.extend(f'    local-zone: "{zone}" ipset' for zone in zones)
+        lines.extend([
+            'ipset:',
+            f'    name-v4: "{IPSET_V4}"',
+            f'    name-v6: "{IPSET_V6}"',
+        ])
+        upstream = self.network_config.get('dns_server')
+        if upstream:
+            lines.extend([
+                'forward-zone:',
+                '    name: "."',
+                f'    forward-addr: {upstream}',
+            ])
+        return '\n'.join(lines) + '\n'
+    
+    def _point_resolver_at_unbound(self):
+        """Make 127.0.0.1 the only nameserver for exam traffic."""
+        if self.is_testing:
+            # `ip netns exec` bind-mounts this over /etc/resolv.conf for the namespace
+            netns_dir = f'/etc/netns/{self.namespace}'
+            os.makedirs(netns_dir, exist_ok=True)
+            self._resolver_redirected = True
+            with open(os.path.join(netns_dir, 'resolv.conf'), 'w') as f:
+                f.write('nameserver 127.0.0.1\n')
+            return
+        
+        # Production: keep the original (often a symlink) so stop() can put it back
+        if os.path.exists(RESOLV_BACKUP_PATH):
+            # Left by a run that never stopped; the current file is ours
+            logger.warning("Keeping the resolv.conf backup from an earlier run")
+        else:
+            if os.path.islink('/etc/resolv.conf'):
+                backup = 'symlink:' + os.readlink('/etc/resolv.conf')
+            else:
+                with open('/etc/resolv.conf', 'r') as f:
+                    backup = f.read()
+            os.makedirs(RUN_DIR, mode=0o700, exist_ok=True)
+            fd, backup_tmp = tempfile.mkstemp(dir=RUN_DIR, prefix='.resolv.')
+            with os.fdopen(fd, 'w') as f:
+                f.write(backup)
+            os.replace(backup_tmp, RESOLV_BACKUP_PATH)
+        self._resolver_redirected = True
+        tmp_path = '/etc/resolv.conf.exam'
+        with open(tmp_path, 'w') as f:
+            f.write('nameserver 127.0.0.1\n')
+        os.replace(tmp_path, '/etc/resolv.conf')
+    
+    def _restore_resolver(self):
+        """Undo _point_resolver_at_unbound."""
+        if self.is_testing:
+            try:
+                os.remove(f'/etc/netns/{self.namespace}/resolv.conf')
+            except OSError:
+                pass
+            return
+        
+        if not os.path.exists(RESOLV_BACKUP_PATH):
+            logger.error("No resolv.conf backup at %s; /etc/resolv.conf still "
+                         "points at 127.0.0.1 and must be restored by hand", RESOLV_BACKUP_PATH)
+            return
+        with open(RESOLV_BACKUP_PATH, 'r') as f:
+            backup = f.read()
+        if backup.startswith('symlink:'):
+            os.remove('/etc/resolv.conf')
+            os.symlink(backup[len('symlink:'):], '/etc/resolv.conf')
+        else:
+            tmp_path = '/etc/resolv.conf.exam'
+            with open(tmp_path, 'w') as f:
+                f.write(backup)
+            os.replace(tmp_path, '/etc/resolv.conf')
+        os.remove(RESOLV_BACKUP_PATH)
+        logger.info("  Original resolv.conf restored")
+    
+    def start_dns_allowlist(self):
+        """Enforce the allowlist through a local unbound instead of resolving IPs up front."""
+        logger.info("Starting DNS allowlist resolver...")
+        
+        # Chains and (empty) sets must exist before unbound starts adding to them
+        if not self.configure_iptables_filtering():
+            return False
+        
+        try:
+            fd, self._unbound_conf = tempfile.mkstemp(prefix='exam-unbound-', suffix='.conf')
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.build_unbound_config())
+            
+            self._unbound = subprocess.Popen(
+                self._ns_exec + ['unbound', '-d', '-c', self._unbound_conf],
+                start_new_session=True, **_Q)
+            try:
+                returncode = self._unbound.wait(timeout=UNBOUND_STARTUP_WAIT)
+            except subprocess.TimeoutExpired:
+                returncode = None
+            if returncode is not None:
+                logger.error("unbound exited during startup with status %s", returncode)
+                self._abort_dns_allowlist()
+                return False
+            self._point_resolver_at_unbound()
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.error("Failed to start unbound: %s", e)
+            self._abort_dns_allowlist()
+            return False
+        
+        logger.info("DNS allowlist resolver started with PID %s", self._unbound.pid)
+        return True
+    
+    def stop_dns_allowlist(self):
+        """Stop the local resolver and put the original resolver config back."""
+        if self._unbound is not None:
+            self._unbound.terminate()
+            try:
+                self._unbound.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._unbound.kill()
+                self._unbound.wait()
+            self._unbound = None
+        if self._unbound_conf is not None:
+            try:
+                os.remove(self._unbound_conf)
+            except OSError:
+                pass
+            self._unbound_conf = None
+        if self._resolver_redirected:
+            try:
+                self._restore_resolver()
+                self._resolver_redirected = False
+            except OSError as e:
+                logger.error("Failed to restore resolv.conf: %s", e)
+    
+    def _abort_dns_allowlist(self):
+        """Undo a failed start_dns_allowlist, including the filter rules.
+        
+        The chains would otherwise keep dropping everything not in the
+        (empty) sets, with no resolver left to fill them.
+        """
+        self.stop_dns_allowlist()
+        try:
+            self._remove_filtering()
+        except Exception as e:
+            logger.error("Failed to remove filter rules: %s", e)
+    
     def enable_certificate_pinning(self):
         """
         Optional: Enable certificate pinning for codeforces.com
@@ -280,6 +627,15 @@ class DomainFilter:
         """Start domain filtering."""
         logger.info("Starting Domain Filter...")
         
+        if self.use_dns_allowlist:
+            # The resolver is the allowlist: no DNS phase and no refresh thread
+            if not self.start_dns_allowlist():
+                return False
+            if not self.enable_certificate_pinning():
+                return False
+            logger.info("Domain Filter started successfully")
+            return True
+        
         if not self.resolve_allowed_ips():
             logger.warning("IP resolution had issues, continuing anyway...")
         
@@ -289,70 +645,79 @@ class DomainFilter:
         if not self.enable_certificate_pinning():
             return False
         
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresh_thread.start()
+        
         logger.info("Domain Filter started successfully")
         return True
     
+    def _remove_filtering(self):
+        """Remove the filter chains and ipsets, or restore the saved rules in production."""
+        if self.is_testing:
+            ns_exec = ['ip', 'netns', 'exec', self.namespace]
+            
+            for chain, iptables_cmd, restore_cmd in (
+                    ('EXAM_FILTER', 'iptables', 'iptables-restore'),
+                    ('EXAM_FILTER_V6', 'ip6tables', 'ip6tables-restore')):
+                self._remove_chain(ns_exec, chain, iptables_cmd, restore_cmd)
+            
+            logger.info("Filter chains removed (testing mode)")
+        else:
+            ns_exec = []
+            # In production mode, restore original iptables
+            self.restore_iptables()
+            logger.info("Original iptables rules restored (production mode)")
+        
+        # Sets can only be destroyed once no rule references them
+        for set_name in (IPSET_V4, IPSET_V6):
+            subprocess.run(ns_exec + ['ipset', 'destroy', set_name],
+                          **_Q)
+    
     def stop(self):
         """Stop domain filtering and cleanup."""
         logger.info("Stopping Domain Filter...")
         
+        self._stop_refresh.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+        if self.use_dns_allowlist:
+            self.stop_dns_allowlist()
+        
         try:
-            if self.is_testing:
-                ns_exec = ['ip', 'netns', 'exec', self.namespace]
-                
-                # Remove IPv4 filter chain
-                subprocess.run(ns_exec + ['iptables', '-D', 'OUTPUT', '-j', 'EXAM_FILTER'],
-                              capture_output=True)
-                subprocess.run(ns_exec + ['iptables', '-F', 'EXAM_FILTER'],
-                              capture_output=True)
-                subprocess.run(ns_exec + ['iptables', '-X', 'EXAM_FILTER'],
-                              capture_output=True)
-                
-                # Remove IPv6 filter chain
-                subprocess.run(ns_exec + ['ip6tables', '-D' , 'OUTPUT', '-j', 'EXAM_FILTER_V6'],
-                              capture_output=True)
-                subprocess.run(ns_exec + ['ip6tables', '-F', 'EXAM_FILTER_V6'],
-                              capture_output=True)
-                subprocess.run(ns_exec + ['ip6tables', '-X', 'EXAM_FILTER_V6'],
-                              capture_output=True)
-                
-                logger.info("Filter chains removed (testing mode)")
-            else:
-                # In production mode, restore original iptables
-                self.restore_iptables()
-                logger.info("Original iptables rules restored (production mode)")
-            
+            self._remove_filtering()
             logger.info("Domain Filter stopped successfully")
             return True
             
         except Exception as e:
-            logger.error(f"Error stopping domain filter: {str(e)}")
+            logger.error("Error stopping domain filter: %s", e)
             return False
     
     def test_connection(self, domain):
         """Test if connection to a domain is allowed."""
-        logger.info(f"Testing connection to {domain}...")
+        logger.info("Testing connection to %s...", domain)
         
         try:
             if self.is_testing:
                 result = subprocess.run(['ip', 'netns', 'exec', self.namespace,
                                         'curl', '-I', '--max-time', '5',
                                         f'https://{domain}'],
-                                       capture_output=True, text=True, timeout=10)
+                                       timeout=10, **_Q)
             else:
                 result = subprocess.run(['curl', '-I', '--max-time', '5',
                                         f'https://{domain}'],
-                                       capture_output=True, text=True, timeout=10)
+                                       timeout=10, **_Q)
             
             if result.returncode == 0:
-                logger.info(f"  ✓ {domain} - ALLOWED")
+                logger.info("  ✓ %s - ALLOWED", domain)
                 return True
             else:
-                logger.info(f"  ✗ {domain} - BLOCKED")
+                logger.info("  ✗ %s - BLOCKED", domain)
                 return False
                 
         except Exception as e:
-            logger.error(f"Test failed: {str(e)}")
+            logger.error("Test failed: %s", e)
             return False
 
 
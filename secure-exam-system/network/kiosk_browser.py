@@ -5,32 +5,40 @@ Implements a fullscreen locked browser for codeforces.com with escape prevention
 """
 
 import subprocess
-import json
 import logging
 import os
 import signal
+import sys
 import time
+from functools import cached_property
 from pathlib import Path
 
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
+
 logger = logging.getLogger(__name__)
 
 
 class KioskBrowser:
-    def __init__(self, config_path=None):
+    def __init__(self, config_path=None, config=None):
         """Initialize kiosk browser with configuration.
         
         Args:
             config_path: Path to configuration file. If None, uses environment variable
                         EXAM_CONFIG or defaults to config/system_config.json
+            config: Already-parsed configuration dict, skips re-reading the file
         """
-        if config_path is None:
-            config_path = os.environ.get('EXAM_CONFIG')
+        if config is None:
             if config_path is None:
-                script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                config_path = os.path.join(script_dir, 'config', 'system_config.json')
-        
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+                config_path = os.environ.get('EXAM_CONFIG')
+                if config_path is None:
+                    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                    config_path = os.path.join(script_dir, 'config', 'system_config.json')
+            
+            config = load_config(config_path)
+        self.config = config
         
         self.mode = self.config['mode']
         self.kiosk_config = self.config['kiosk']
@@ -44,10 +52,32 @@ class KioskBrowser:
         
         self.process = None
         
-        logger.info(f"Kiosk Browser initialized in {self.mode} mode")
+        # Resolver rules depend only on config, so build them once
+        self._host_resolver_rules = self.build_host_resolver_rules()
+        
+        logger.info("Kiosk Browser initialized in %s mode", self.mode)
     
-    def build_browser_args(self):
-        """Build command-line arguments for kiosk mode browser."""
+    def build_host_resolver_rules(self):
+        """Build a Chromium --host-resolver-rules value allowing only configured domains.
+        
+        Every hostname maps to ~NOTFOUND except the allowed domains. A
+        '*.example.com' entry also allows the bare 'example.com'.
+        """
+        excluded = []
+        for domain in self.network_config.get('allowed_domains', []):
+            bare = domain.replace('*.', '')
+            for pattern in (domain, bare):
+                if pattern not in excluded:
+                    excluded.append(pattern)
+        return ', '.join(['MAP * ~NOTFOUND'] + [f'EXCLUDE {d}' for d in excluded])
+    
+    @cached_property
+    def browser_args(self):
+        """Command-line arguments for kiosk mode browser.
+        
+        Built once per instance so browser restarts reuse the same list;
+        drop it with self.__dict__.pop('browser_args', None) after a config change.
+        """
         args = [self.browser]
         
         # Kiosk mode - fullscreen, no UI
@@ -70,9 +100,8 @@ class KioskBrowser:
         if self.kiosk_config.get('disable_context_menu', True):
             args.append('--disable-background-networking')
         
-        # Content settings to block non-codeforces domains at browser level
-        allowed_domains = self.network_config.get('allowed_domains', [])
-        domains_str = ','.join([d.replace('*.', '') for d in allowed_domains])
+        # Block non-codeforces domains at browser level: unknown hosts never resolve
+        args.append(f'--host-resolver-rules={self._host_resolver_rules}')
         
         # User data directory
         user_data_dir = '/tmp/exam-browser-profile'
@@ -127,8 +156,9 @@ class KioskBrowser:
         # Disable specific keycodes (common values, may vary on your system)
         # F4 (keycode 70), F11 (keycode 95), Tab (keycode 23), Alt_L (keycode 64)
         keycodes_to_disable = [70, 95, 23, 64]
-        for kc in keycodes_to_disable:
-            subprocess.run(['xmodmap', '-e', f'keycode {kc} = NoSymbol'], capture_output=True)
+        # One xmodmap reading all directives from stdin, same as the restore in stop()
+        script = '\n'.join(f'keycode {kc} = NoSymbol' for kc in keycodes_to_disable)
+        subprocess.run(['xmodmap', '-'], input=script.encode(), capture_output=True)
         
         logger.info("Key blocking applied (production mode).")
         return True
@@ -141,28 +171,28 @@ class KioskBrowser:
         self.setup_key_blocking()
         
         # Build browser command
-        browser_cmd = self.build_browser_args()
+        browser_cmd = self.browser_args
         
         try:
             if self.is_testing:
                 # Run in namespace for testing
                 full_cmd = ['ip', 'netns', 'exec', self.namespace] + browser_cmd
-                logger.info(f"Starting browser in namespace {self.namespace}")
+                logger.info("Starting browser in namespace %s", self.namespace)
             else:
                 full_cmd = browser_cmd
                 logger.info("Starting browser on host")
             
-            logger.info(f"Browser command: {' '.join(full_cmd)}")
+            logger.info("Browser command: %s", ' '.join(full_cmd))
             
             # Start browser
             self.process = subprocess.Popen(
                 full_cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                preexec_fn=os.setsid  # Create new process group
+                start_new_session=True  # Create new process group, no preexec_fn fork penalty
             )
             
-            logger.info(f"Kiosk browser started with PID {self.process.pid}")
+            logger.info("Kiosk browser started with PID %s", self.process.pid)
             
             # Wait a bit to see if it crashes immediately
             time.sleep(2)
@@ -174,7 +204,7 @@ class KioskBrowser:
             return True
             
         except Exception as e:
-            logger.error(f"Failed to start browser: {str(e)}")
+            logger.error("Failed to start browser: %s", e)
             return False
     
     def stop(self):
@@ -191,22 +221,23 @@ class KioskBrowser:
             return True
         
         try:
-            # Terminate browser process group
-            os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
+            # Terminate browser process group (the browser leads its own session,
+            # so its PID is the group ID)
+            os.killpg(self.process.pid, signal.SIGTERM)
             
             # Wait for termination
             try:
                 self.process.wait(timeout=5)
             except subprocess.TimeoutExpired:
                 logger.warning("Browser didn't terminate, forcing kill...")
-                os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
+                os.killpg(self.process.pid, signal.SIGKILL)
                 self.process.wait()
             
             logger.info("Kiosk Browser stopped successfully")
             return True
             
         except Exception as e:
-            logger.error(f"Error stopping browser: {str(e)}")
+            logger.error("Error stopping browser: %s", e)
             return False
     
     def is_running(self):
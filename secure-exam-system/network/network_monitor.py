@@ -5,82 +5,441 @@ Real-time monitoring of network connections and security events.
 """
 
 import subprocess
-import json
+import ctypes
 import logging
+import os
+import re
+import select
+import socket
+import struct
+import sys
 import time
 import threading
+from collections import deque, namedtuple
 from datetime import datetime
+from pathlib import Path
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
+from network.vpn_manager import KILLSWITCH_NFLOG_GROUP
 
 logger = logging.getLogger(__name__)
 
+# rtnetlink multicast group for link up/down/change notifications
+RTMGRP_LINK = 0x1
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+IFLA_IFNAME = 3
+IFF_UP = 0x1
+CLONE_NEWNET = 0x40000000
+
+# Whole log lines carrying one of our iptables LOG prefixes
+_MARKER_RE = re.compile(rb'^[^\n]*\[EXAM-(BLOCKED|KILLSWITCH)\][^\n]*', re.MULTILINE)
+
+# sock_diag constants (linux/netlink.h, linux/sock_diag.h)
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+TCP_STATES = {
+    1: 'ESTAB', 2: 'SYN-SENT', 3: 'SYN-RECV', 4: 'FIN-WAIT-1', 5: 'FIN-WAIT-2',
+    6: 'TIME-WAIT', 7: 'UNCONN', 8: 'CLOSE-WAIT', 9: 'LAST-ACK', 10: 'LISTEN',
+    11: 'CLOSING',
+}
+# What `ss` shows without -a: no LISTEN, CLOSE, TIME-WAIT or SYN-RECV for TCP,
+# and only connected UDP sockets
+TCP_CONNECTED_STATES = 0xfff & ~((1 << 10) | (1 << 7) | (1 << 6) | (1 << 3))
+UDP_CONNECTED_STATES = 1 << 1
+
+Connection = namedtuple('Connection', 'proto state src dst')
+
+# nfnetlink_log constants (linux/netfilter/nfnetlink_log.h)
+NETLINK_NETFILTER = 12
+NFNL_SUBSYS_ULOG = 4
+NFULNL_MSG_PACKET = 0
+NFULNL_MSG_CONFIG = 1
+NFULA_CFG_CMD = 1
+NFULA_CFG_MODE = 2
+NFULA_PAYLOAD = 9
+NFULA_PREFIX = 10
+NFULNL_CFG_CMD_BIND = 1
+NFULNL_COPY_PACKET = 2
+NLM_F_ACK = 0x4
+# Enough of each dropped packet for the IPv4/IPv6 source and destination
+NFLOG_COPY_RANGE = 40
+
+# Back-to-back VPN status checks within this many seconds share one lookup
+STATUS_CACHE_TTL = 1.0
+
+# Timed checks start at MIN_POLL_INTERVAL and double while nothing changes,
+# up to MAX_POLL_INTERVAL; any change snaps back to the minimum. Without a
+# link event socket the timed check is the only way to notice the VPN going
+# down, so the backoff stops at POLL_ONLY_MAX_INTERVAL
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 60.0
+POLL_ONLY_MAX_INTERVAL = 5.0
+
 
 class NetworkMonitor:
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config=None):
         """Initialize network monitor."""
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+        if config is None:
+            config = load_config(config_path)
+        self.config = config
         
         self.mode = self.config['mode']
         self.vpn_config = self.config['vpn']
         self.namespace = self.vpn_config.get('namespace', 'exam_ns')
+        self.interface = self.vpn_config.get('interface', 'wg0')
         self.is_testing = (self.mode == 'testing')
         
         self.monitoring = False
         self.monitor_thread = None
         
+        # Recent marker lines, fed incrementally from /dev/kmsg
+        self._blocked = deque(maxlen=10)
+        self._killswitch = deque(maxlen=10)
+        self._kmsg_lock = threading.Lock()
+        self._kmsg = None
+        self._last_seq = None  # Highest kmsg sequence number already processed
+        self._open_kmsg()
+        self._blocked_total = 0
+        self._wake_r = self._wake_w = None
+        self._diag_sock = None
+        self._diag_lock = threading.Lock()
+        self._vpn_status_cache = None
+        self._nflog = None
+        self._killswitch_total = 0
+        # Long-lived `dmesg --follow`, used only when /dev/kmsg can't be opened here
+        self._dmesg = None
+        self._dmesg_buf = b''
+        
         logger.info(f"Network Monitor initialized in {self.mode} mode")
     
+    def _sock_diag_dump(self, family, protocol, states):
+        """Dump sockets of one family/protocol through NETLINK_SOCK_DIAG."""
+        request = struct.pack('=BBBxI48x', family, protocol, 0, states)
+        header = struct.pack('=IHHII', 16 + len(request), SOCK_DIAG_BY_FAMILY,
+                             NLM_F_REQUEST | NLM_F_DUMP, 0, 0)
+        self._diag_sock.send(header + request)
+        
+        addr_len = 4 if family == socket.AF_INET else 16
+        proto_name = 'tcp' if protocol == socket.IPPROTO_TCP else 'udp'
+        connections = []
+        while True:
+            data = self._diag_sock.recv(65536)
+            if not data:
+                return connections
+            offset = 0
+            while offset + 16 <= len(data):
+                msg_len, msg_type = struct.unpack_from('=IH', data, offset)
+                if msg_type == NLMSG_DONE:
+                    return connections
+                if msg_type == NLMSG_ERROR:
+                    errno = -struct.unpack_from('=i', data, offset + 16)[0]
+                    raise OSError(errno, os.strerror(errno))
+                
+                # struct inet_diag_msg: family, state, timer, retrans, then inet_diag_sockid
+                state = data[offset + 17]
+                sport, dport = struct.unpack_from('>HH', data, offset + 20)
+                src = socket.inet_ntop(family, data[offset + 24:offset + 24 + addr_len])
+                dst = socket.inet_ntop(family, data[offset + 40:offset + 40 + addr_len])
+                connections.append(Connection(proto_name, TCP_STATES.get(state, str(state)),
+                                              f'{src}:{sport}', f'{dst}:{dport}'))
+                offset += (msg_len + 3) & ~3
+    
     def get_active_connections(self):
-        """Get list of active network connections."""
+        """Get list of active network connections.
+        
+        Queries the kernel over NETLINK_SOCK_DIAG (what `ss` uses) instead
+        of running `ss -tupn`. Like `ss` without -a, listening and closing
+        TCP sockets and unconnected UDP sockets are left out.
+        
+        Returns:
+            List of Connection(proto, state, src, dst) tuples
+        """
         try:
-            if self.is_testing:
-                result = subprocess.run(['ip', 'netns', 'exec', self.namespace,
-                                        'ss', '-tupn'],
-                                       capture_output=True, text=True)
-            else:
-                result = subprocess.run(['ss', '-tupn'],
-                                       capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                return result.stdout
-            return ""
+            with self._diag_lock:
+                if self._diag_sock is None:
+                    self._diag_sock = self._netlink_socket(NETLINK_SOCK_DIAG)
+                
+                connections = []
+                for family in (socket.AF_INET, socket.AF_INET6):
+                    connections += self._sock_diag_dump(family, socket.IPPROTO_TCP, TCP_CONNECTED_STATES)
+                    connections += self._sock_diag_dump(family, socket.IPPROTO_UDP, UDP_CONNECTED_STATES)
+                return connections
             
         except Exception as e:
             logger.error(f"Failed to get connections: {str(e)}")
-            return ""
+            return []
+    
+    def check_vpn_status(self, use_cache=True):
+        """Check if VPN is active.
+        
+        Args:
+            use_cache: Reuse a result younger than STATUS_CACHE_TTL seconds
+        """
+        now = time.monotonic()
+        cached = self._vpn_status_cache
+        if use_cache and cached and now - cached[0] < STATUS_CACHE_TTL:
+            return cached[1]
+        active = self._query_vpn_status()
+        self._vpn_status_cache = (now, active)
+        return active
     
-    def check_vpn_status(self):
-        """Check if VPN is active."""
+    def _query_vpn_status(self):
+        """See whether the VPN interface is up without forking.
+        
+        In production the link state is read from sysfs. sysfs shows the
+        host's interfaces, so in testing mode the interface is looked up
+        over rtnetlink from inside the namespace instead.
+        """
+        if self.is_testing:
+            return self._query_link_up()
         try:
-            if self.is_testing:
-                result = subprocess.run(['ip', 'netns', 'exec', self.namespace,
-                                        'wg', 'show'],
-                                       capture_output=True, text=True)
-            else:
-                result = subprocess.run(['wg', 'show'],
-                                       capture_output=True, text=True)
-            
-            return result.returncode == 0
-            
-        except Exception as e:
+            with open(f'/sys/class/net/{self.interface}/operstate') as f:
+                # WireGuard links report "unknown" while up
+                return f.read().strip() in ('up', 'unknown')
+        except OSError:
+            return False
+    
+    def _query_link_up(self):
+        """Ask rtnetlink whether the VPN interface exists and is up."""
+        name = self.interface.encode() + b'\0'
+        attr = struct.pack('=HH', 4 + len(name), IFLA_IFNAME) + name
+        attr += b'\0' * (-len(attr) % 4)
+        payload = struct.pack('=BxHiII', socket.AF_UNSPEC, 0, 0, 0, 0) + attr
+        request = struct.pack('=IHHII', 16 + len(payload), RTM_GETLINK,
+                              NLM_F_REQUEST, 1, 0) + payload
+        try:
+            sock = self._netlink_socket(socket.NETLINK_ROUTE)
+        except OSError:
+            return False
+        try:
+            sock.send(request)
+            data = sock.recv(65536)
+        except OSError:
             return False
+        finally:
+            sock.close()
+        if len(data) < 32:
+            return False
+        msg_type = struct.unpack_from('=H', data, 4)[0]
+        if msg_type != RTM_NEWLINK:
+            return False
+        flags = struct.unpack_from('=I', data, 24)[0]
+        return bool(flags & IFF_UP)
+    
+    def _open_kmsg(self):
+        """Open /dev/kmsg so only records not yet processed are read.
+        
+        The first open starts at the end of the log. A reopen after stop()
+        starts at the oldest record instead, and _last_seq filters out what
+        was already seen, so records logged while stopped are not lost.
+        """
+        try:
+            self._kmsg = os.open('/dev/kmsg', os.O_RDONLY | os.O_NONBLOCK)
+            if self._last_seq is None:
+                os.lseek(self._kmsg, 0, os.SEEK_END)
+        except OSError as e:
+            # Needs CAP_SYSLOG when dmesg_restrict is set; fall back to dmesg
+            logger.warning(f"Cannot stream /dev/kmsg ({e}), falling back to dmesg")
+            self._kmsg = None
+    
+    def _drain_kmsg(self):
+        """Read all records logged since the last call into the marker deques."""
+        while True:
+            try:
+                record = os.read(self._kmsg, 8192)  # One record per read
+            except BlockingIOError:
+                return
+            except BrokenPipeError:
+                continue  # Ring buffer overran us; reading resumes at the oldest record
+            if not record:
+                return
+            # Record format: "prio,seq,ts,flags;message\n" plus optional continuation lines.
+            # Only the prefix up to ';' is parsed, the timestamp is never formatted.
+            header_end = record.find(b';')
+            try:
+                seq = int(record[:header_end].split(b',', 2)[1])
+            except (IndexError, ValueError):
+                continue
+            if self._last_seq is not None and seq <= self._last_seq:
+                continue
+            self._last_seq = seq
+            match = _MARKER_RE.search(record[header_end + 1:])
+            if match is None:
+                continue
+            line = match.group(0).decode('utf-8', 'replace')
+            if match.group(1) == b'BLOCKED':
+                self._blocked.append(line)
+                self._blocked_total += 1
+            else:
+                self._killswitch.append(line)
+    
+    def _open_nflog(self):
+        """Bind to the kill switch's NFLOG group.
+        
+        Returns:
+            Non-blocking netlink socket, or None if it could not be opened
+        """
+        try:
+            sock = self._netlink_socket(NETLINK_NETFILTER)
+        except OSError:
+            return None
+        try:
+            msg_type = (NFNL_SUBSYS_ULOG << 8) | NFULNL_MSG_CONFIG
+            nfgen = struct.pack('=BBH', socket.AF_UNSPEC, 0, socket.htons(KILLSWITCH_NFLOG_GROUP))
+            for attr in (struct.pack('=HHB3x', 5, NFULA_CFG_CMD, NFULNL_CFG_CMD_BIND),
+                         struct.pack('=HH', 10, NFULA_CFG_MODE)
+                         + struct.pack('>IBx2x', NFLOG_COPY_RANGE, NFULNL_COPY_PACKET)):
+                body = nfgen + attr
+                sock.send(struct.pack('=IHHII', 16 + len(body), msg_type,
+                                      NLM_F_REQUEST | NLM_F_ACK, 0, 0) + body)
+                ack = sock.recv(4096)
+                errno = -struct.unpack_from('=i', ack, 16)[0]
+                if errno:
+                    raise OSError(errno, os.strerror(errno))
+            sock.setblocking(False)
+            return sock
+        except OSError as e:
+            logger.warning(f"Cannot listen for kill switch NFLOG events ({e})")
+            sock.close()
+            return None
+    
+    def _drain_nflog(self):
+        """Read batched kill switch drops from NFLOG into the marker deque."""
+        packet_type = (NFNL_SUBSYS_ULOG << 8) | NFULNL_MSG_PACKET
+        while True:
+            try:
+                data = self._nflog.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                continue  # ENOBUFS: the kernel dropped messages for us, keep going
+            if not data:
+                return
+            offset = 0
+            while offset + 16 <= len(data):
+                msg_len, msg_type = struct.unpack_from('=IH', data, offset)
+                if msg_len < 16:
+                    break
+                if msg_type == packet_type:
+                    self._killswitch.append(self._format_nflog_packet(data[offset + 20:offset + msg_len]))
+                    self._killswitch_total += 1
+                offset += (msg_len + 3) & ~3
+    
+    @staticmethod
+    def _format_nflog_packet(attrs):
+        """Render an NFLOG packet's prefix and addresses like a LOG line."""
+        prefix = '[EXAM-KILLSWITCH]'
+        addresses = ''
+        pos = 0
+        while pos + 4 <= len(attrs):
+            attr_len, attr_type = struct.unpack_from('=HH', attrs, pos)
+            if attr_len < 4:
+                break
+            value = attrs[pos + 4:pos + attr_len]
+            attr_type &= 0x7fff
+            if attr_type == NFULA_PREFIX:
+                prefix = value.rstrip(b'\0').decode('utf-8', 'replace')
+            elif attr_type == NFULA_PAYLOAD and value:
+                if value[0] >> 4 == 4 and len(value) >= 20:
+                    addresses = (f" SRC={socket.inet_ntop(socket.AF_INET, value[12:16])}"
+                                 f" DST={socket.inet_ntop(socket.AF_INET, value[16:20])}")
+                elif value[0] >> 4 == 6 and len(value) >= 40:
+                    addresses = (f" SRC={socket.inet_ntop(socket.AF_INET6, value[8:24])}"
+                                 f" DST={socket.inet_ntop(socket.AF_INET6, value[24:40])}")
+            pos += (attr_len + 3) & ~3
+        return prefix + addresses
+    
+    def _start_dmesg_follow(self):
+        """Spawn one `dmesg --follow` whose output is drained between ticks."""
+        try:
+            self._dmesg = subprocess.Popen(['dmesg', '--follow', '--notime', '-l', 'warn'],
+                                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            os.set_blocking(self._dmesg.stdout.fileno(), False)
+            self._dmesg_buf = b''
+        except OSError as e:
+            logger.warning(f"Cannot follow dmesg ({e}), reading the log per check")
+            self._dmesg = None
+    
+    def _stop_dmesg_follow(self):
+        """Terminate the follower, if running."""
+        if self._dmesg is not None:
+            self._dmesg.terminate()
+            self._dmesg.wait()
+            self._dmesg.stdout.close()
+            self._dmesg = None
+    
+    def _drain_dmesg(self):
+        """Read whatever the follower printed since the last call into the deques."""
+        fd = self._dmesg.stdout.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                # dmesg exited (e.g. no permission); fall back to one-shot reads
+                self._dmesg.wait()
+                self._dmesg.stdout.close()
+                self._dmesg = None
+                break
+            self._dmesg_buf += chunk
+        
+        # Keep a trailing partial line for the next drain
+        complete, _, self._dmesg_buf = self._dmesg_buf.rpartition(b'\n')
+        for match in _MARKER_RE.finditer(complete):
+            line = match.group(0).decode('utf-8', 'replace')
+            if match.group(1) == b'BLOCKED':
+                self._blocked.append(line)
+                self._blocked_total += 1
+            else:
+                self._killswitch.append(line)
     
     def read_iptables_log(self):
         """Read iptables log for blocked connections."""
+        if self._nflog is not None:
+            with self._kmsg_lock:
+                self._drain_nflog()
+        
+        if self._kmsg is not None or self._dmesg is not None:
+            with self._kmsg_lock:
+                if self._kmsg is not None:
+                    self._drain_kmsg()
+                else:
+                    self._drain_dmesg()
+                return {
+                    'blocked_connections': list(self._blocked),  # Last 10
+                    'killswitch_blocks': list(self._killswitch)
+                }
+        
         try:
             # Read kernel log for our custom markers
-            result = subprocess.run(['dmesg', '-T'],
-                                   capture_output=True, text=True)
+            # iptables LOG defaults to warning level; timestamps are never used
+            result = subprocess.run(['dmesg', '--notime', '-l', 'warn'],
+                                   capture_output=True)
             
             if result.returncode == 0:
-                # Filter for our log markers
-                lines = result.stdout.split('\n')
-                blocked = [l for l in lines if '[EXAM-BLOCKED]' in l]
-                killswitch = [l for l in lines if '[EXAM-KILLSWITCH]' in l]
+                # One regex pass over the raw output; only matching lines are decoded
+                blocked = []
+                killswitch = []
+                for match in _MARKER_RE.finditer(result.stdout):
+                    bucket = blocked if match.group(1) == b'BLOCKED' else killswitch
+                    bucket.append(match.group(0).decode('utf-8', 'replace'))
                 
                 return {
                     'blocked_connections': blocked[-10:],  # Last 10
-                    'killswitch_blocks': killswitch[-10:]
+                    # Kill switch drops arrive over NFLOG, not the kernel log
+                    'killswitch_blocks': (list(self._killswitch) if self._nflog is not None
+                                          else killswitch[-10:])
                 }
             return {}
             
@@ -88,27 +447,161 @@ class NetworkMonitor:
             logger.error(f"Failed to read logs: {str(e)}")
             return {}
     
-    def monitor_loop(self):
-        """Main monitoring loop."""
-        logger.info("Starting monitoring loop...")
+    def _netlink_socket(self, protocol, groups=0):
+        """Open a netlink socket in the VPN's network namespace.
         
-        while self.monitoring:
-            # Check VPN status
-            vpn_active = self.check_vpn_status()
-            if not vpn_active:
-                logger.error("⚠️  VPN IS DOWN! Kill switch should be blocking all traffic")
-            
-            # Check for blocked connections
-            logs = self.read_iptables_log()
+        In testing mode the socket is created inside the namespace; setns
+        only switches the calling thread, which is switched back.
+        
+        Raises:
+            OSError: if the socket or namespace switch fails
+        """
+        if not self.is_testing:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, protocol)
+            sock.bind((0, groups))
+            return sock
+        
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        own_ns = os.open('/proc/thread-self/ns/net', os.O_RDONLY)
+        try:
+            target_ns = os.open(f'/var/run/netns/{self.namespace}', os.O_RDONLY)
+            try:
+                if libc.setns(target_ns, CLONE_NEWNET) != 0:
+                    raise OSError(ctypes.get_errno(), "setns failed")
+                try:
+                    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, protocol)
+                    sock.bind((0, groups))
+                finally:
+                    libc.setns(own_ns, CLONE_NEWNET)
+            finally:
+                os.close(target_ns)
+        finally:
+            os.close(own_ns)
+        return sock
+    
+    def _open_link_socket(self, warn=True):
+        """Subscribe to rtnetlink link events in the VPN's network namespace.
+        
+        Args:
+            warn: Log a failure as a warning (retries only log at debug)
+        
+        Returns:
+            Non-blocking netlink socket, or None if it could not be opened
+        """
+        try:
+            sock = self._netlink_socket(socket.NETLINK_ROUTE, RTMGRP_LINK)
+            sock.setblocking(False)
+            return sock
+        except OSError as e:
+            if warn:
+                logger.warning(f"Link event subscription unavailable ({e}), polling VPN status")
+            else:
+                logger.debug(f"Link event subscription still unavailable ({e})")
+            return None
+    
+    def _report_vpn_status(self, use_cache=True):
+        """Check VPN status and log loudly if it is down.
+        
+        Returns:
+            True if the VPN is up
+        """
+        vpn_active = self.check_vpn_status(use_cache)
+        if not vpn_active:
+            logger.error("⚠️  VPN IS DOWN! Kill switch should be blocking all traffic")
+        return vpn_active
+    
+    def _report_blocked(self):
+        """Log blocked connection attempts seen since the last report.
+        
+        Returns:
+            True if there were blocked attempts to report
+        """
+        seen = self._blocked_total
+        dropped = self._killswitch_total
+        logs = self.read_iptables_log()
+        if self._killswitch_total > dropped:
+            logger.warning(f"Kill switch dropped {self._killswitch_total - dropped} packets")
+        if self._kmsg is None and self._dmesg is None:
+            # One-shot dmesg has no running count, report the recent window
             if logs.get('blocked_connections'):
                 logger.info(f"Blocked {len(logs['blocked_connections'])} unauthorized connection attempts")
-            
-            time.sleep(5)  # Check every 5 seconds
+                return True
+        elif self._blocked_total > seen:
+            logger.info(f"Blocked {self._blocked_total - seen} unauthorized connection attempts")
+            return True
+        return False
+    
+    def monitor_loop(self):
+        """Main monitoring loop.
+        
+        Sleeps in select() until a link changes, a kernel log record
+        arrives or stop() is called, instead of waking every few seconds.
+        The timed check backs off while the state stays the same.
+        """
+        logger.info("Starting monitoring loop...")
+        
+        link_sock = self._open_link_socket()
+        self._nflog = self._open_nflog()
+        interval = MIN_POLL_INTERVAL
+        
+        try:
+            last_vpn_active = self._report_vpn_status()
+            while self.monitoring:
+                dmesg_out = self._dmesg.stdout if self._dmesg is not None else None
+                watched = [fd for fd in (self._wake_r, link_sock, self._kmsg, self._nflog, dmesg_out)
+                           if fd is not None]
+                ready, _, _ = select.select(watched, [], [], interval)
+                if not self.monitoring:
+                    break
+                if not ready:
+                    # The VPN may have created the namespace and kill switch since
+                    if link_sock is None:
+                        link_sock = self._open_link_socket(warn=False)
+                    if self._nflog is None:
+                        self._nflog = self._open_nflog()
+                vpn_active = last_vpn_active
+                new_blocked = False
+                
+                if not ready or link_sock in ready:
+                    if link_sock is not None:
+                        # Content doesn't matter, any link change triggers a check
+                        try:
+                            while link_sock.recv(65536):
+                                pass
+                        except BlockingIOError:
+                            pass
+                    # A link just changed, so a cached answer may be stale
+                    vpn_active = self._report_vpn_status(use_cache=not ready)
+                
+                if (not ready or self._kmsg in ready or self._nflog in ready
+                        or (dmesg_out is not None and dmesg_out in ready)):
+                    new_blocked = self._report_blocked()
+                
+                if vpn_active == last_vpn_active and not new_blocked:
+                    cap = MAX_POLL_INTERVAL if link_sock is not None else POLL_ONLY_MAX_INTERVAL
+                    interval = min(interval * 2, cap)
+                else:
+                    interval = MIN_POLL_INTERVAL
+                last_vpn_active = vpn_active
+        finally:
+            if link_sock is not None:
+                link_sock.close()
+            with self._kmsg_lock:
+                if self._nflog is not None:
+                    self._nflog.close()
+                    self._nflog = None
     
     def start(self):
         """Start network monitoring."""
         logger.info("Starting Network Monitor...")
         
+        if self._kmsg is None:
+            self._open_kmsg()
+        if self._kmsg is None and self._dmesg is None:
+            self._start_dmesg_follow()
+        # Self-pipe so stop() can wake the loop out of select()
+        self._wake_r, self._wake_w = os.pipe()
+        
         self.monitoring = True
         self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
         self.monitor_thread.start()
@@ -121,8 +614,24 @@ class NetworkMonitor:
         logger.info("Stopping Network Monitor...")
         
         self.monitoring = False
+        if self._wake_w is not None:
+            os.write(self._wake_w, b'x')
         if self.monitor_thread:
             self.monitor_thread.join(timeout=10)
+        if self._wake_w is not None:
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+        
+        with self._kmsg_lock:
+            if self._kmsg is not None:
+                os.close(self._kmsg)
+                self._kmsg = None
+            self._stop_dmesg_follow()
+        with self._diag_lock:
+            if self._diag_sock is not None:
+                self._diag_sock.close()
+                self._diag_sock = None
         
         logger.info("Network Monitor stopped successfully")
         return True
@@ -158,7 +667,8 @@ def main():
             print(f"VPN Active: {status['vpn_active']}")
             print(f"Timestamp: {status['timestamp']}")
             print(f"\nActive Connections:")
-            print(status['active_connections'][:500])  # First 500 chars
+            for conn in status['active_connections'][:20]:  # First 20
+                print(f"  {conn.proto:<4} {conn.state:<11} {conn.src:<30} {conn.dst}")
             
             time.sleep(10)
             
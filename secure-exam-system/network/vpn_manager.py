@@ -5,25 +5,53 @@ Manages VPN tunnel creation and routing with support for testing/production mode
 """
 
 import subprocess
-import json
 import logging
 import os
+import sys
+import time
 from pathlib import Path
 
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
+
 logger = logging.getLogger(__name__)
 
+# NFLOG group the kill switch reports dropped packets to; NetworkMonitor
+# listens on it. The threshold batches that many packets per netlink message.
+KILLSWITCH_NFLOG_GROUP = 1
+KILLSWITCH_NFLOG_THRESHOLD = 50
+
+# get_status calls within this many seconds share one `wg show`
+STATUS_CACHE_TTL = 1.0
+
+
+def _run(cmd, check=False):
+    """Run a command whose output nobody reads, without allocating pipes."""
+    return subprocess.run(cmd, check=check,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
 
 class VPNManager:
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
-        """Initialize VPN manager with configuration."""
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config=None):
+        """Initialize VPN manager with configuration.
+
+        Args:
+            config_path: Path to configuration file (used when config is None)
+            config: Already-parsed configuration dict, skips re-reading the file
+        """
+        if config is None:
+            config = load_config(config_path)
+        self.config = config
         
         self.mode = self.config['mode']
         self.vpn_config = self.config['vpn']
         self.interface = self.vpn_config['interface']
         self.namespace = self.vpn_config.get('namespace', 'exam_ns')
         self.is_testing = (self.mode == 'testing')
+        self._status_cache = None
         
         logger.info(f"VPN Manager initialized in {self.mode} mode")
     
@@ -94,13 +122,10 @@ class VPNManager:
             # Get VPN gateway from config
             vpn_gateway = self.vpn_config.get('vpn_gateway', '10.8.0.1')
             
-            # Delete default route
+            # Swap the default route over to the VPN in one atomic call;
+            # replace adds the route if there is no default to delete
             logger.info("Configuring routes to force all traffic through VPN")
-            subprocess.run(ns_exec + ['ip', 'route', 'del', 'default'], 
-                          capture_output=True)
-            
-            # Add default route through VPN
-            subprocess.run(ns_exec + ['ip', 'route', 'add', 'default', 
+            subprocess.run(ns_exec + ['ip', 'route', 'replace', 'default',
                                      'via', vpn_gateway, 'dev', self.interface],
                           check=True, capture_output=True)
             
@@ -128,42 +153,31 @@ class VPNManager:
             
             logger.info("Enabling VPN kill switch")
             
-            # Flush existing rules
-            subprocess.run(ns_exec + ['iptables', '-F'], capture_output=True)
-            subprocess.run(ns_exec + ['iptables', '-X'], capture_output=True)
-            
-            # Set default policies to DROP
-            subprocess.run(ns_exec + ['iptables', '-P', 'INPUT', 'DROP'], 
-                          check=True, capture_output=True)
-            subprocess.run(ns_exec + ['iptables', '-P', 'FORWARD', 'DROP'], 
-                          check=True, capture_output=True)
-            subprocess.run(ns_exec + ['iptables', '-P', 'OUTPUT', 'DROP'], 
-                          check=True, capture_output=True)
-            
-            # Allow loopback
-            subprocess.run(ns_exec + ['iptables', '-A', 'INPUT', '-i', 'lo', 
-                                     '-j', 'ACCEPT'], check=True, capture_output=True)
-            subprocess.run(ns_exec + ['iptables', '-A', 'OUTPUT', '-o', 'lo', 
-                                     '-j', 'ACCEPT'], check=True, capture_output=True)
-            
-            # Allow traffic through VPN interface only
-            subprocess.run(ns_exec + ['iptables', '-A', 'INPUT', '-i', 
-                                     self.interface, '-j', 'ACCEPT'], 
-                          check=True, capture_output=True)
-            subprocess.run(ns_exec + ['iptables', '-A', 'OUTPUT', '-o', 
-                                     self.interface, '-j', 'ACCEPT'], 
-                          check=True, capture_output=True)
-            
-            # Allow established connections
-            subprocess.run(ns_exec + ['iptables', '-A', 'INPUT', '-m', 'state', 
-                                     '--state', 'ESTABLISHED,RELATED', '-j', 'ACCEPT'],
+            # One atomic iptables-restore instead of a command per rule. Without
+            # --noflush it flushes the table and deletes user chains (-F/-X),
+            # and the chain headers set the DROP policies.
+            ruleset = '\n'.join([
+                '*filter',
+                ':INPUT DROP [0:0]',
+                ':FORWARD DROP [0:0]',
+                ':OUTPUT DROP [0:0]',
+                # Allow loopback
+                '-A INPUT -i lo -j ACCEPT',
+                '-A OUTPUT -o lo -j ACCEPT',
+                # Allow traffic through VPN interface only
+                f'-A INPUT -i {self.interface} -j ACCEPT',
+                f'-A OUTPUT -o {self.interface} -j ACCEPT',
+                # Allow established connections
+                '-A INPUT -m state --state ESTABLISHED,RELATED -j ACCEPT',
+                # Report dropped packets over NFLOG, batched in-kernel, so a
+                # flood doesn't go through printk and drown the kernel log
+                f'-A OUTPUT -j NFLOG --nflog-group {KILLSWITCH_NFLOG_GROUP} '
+                f'--nflog-threshold {KILLSWITCH_NFLOG_THRESHOLD} --nflog-prefix "[EXAM-KILLSWITCH]"',
+                'COMMIT',
+            ]) + '\n'
+            subprocess.run(ns_exec + ['iptables-restore'], input=ruleset.encode(),
                           check=True, capture_output=True)
             
-            # Log dropped packets
-            subprocess.run(ns_exec + ['iptables', '-A', 'OUTPUT', '-j', 'LOG', 
-                                     '--log-prefix', '[EXAM-KILLSWITCH] '],
-                          capture_output=True)
-            
             logger.info("Kill switch enabled - all non-VPN traffic will be blocked")
             return True
             
@@ -182,6 +196,8 @@ class VPNManager:
         if not self.setup_vpn_tunnel():
             return False
         
+        # Route first: the kill switch drops everything off the tunnel, so
+        # it must never be left in place without a working route
         if not self.configure_routing():
             return False
         
@@ -198,19 +214,15 @@ class VPNManager:
         try:
             if self.is_testing:
                 # Stop VPN in namespace
-                subprocess.run(['ip', 'netns', 'exec', self.namespace, 
-                               'wg-quick', 'down', self.vpn_config.get('config_path')],
-                              capture_output=True)
+                _run(['ip', 'netns', 'exec', self.namespace,
+                      'wg-quick', 'down', self.vpn_config.get('config_path')])
                 
                 # Delete namespace
-                subprocess.run(['ip', 'netns', 'del', self. namespace],
-                              capture_output=True)
+                _run(['ip', 'netns', 'del', self.namespace])
                 logger.info(f"Namespace {self.namespace} deleted")
             else:
                 # Stop VPN on host
-                subprocess.run(['wg-quick', 'down', 
-                               self.vpn_config.get('config_path')],
-                              capture_output=True)
+                _run(['wg-quick', 'down', self.vpn_config.get('config_path')])
             
             logger.info("VPN Manager stopped successfully")
             return True
@@ -220,7 +232,16 @@ class VPNManager:
             return False
     
     def get_status(self):
-        """Get VPN status information."""
+        """Get VPN status information, memoized for STATUS_CACHE_TTL seconds."""
+        now = time.monotonic()
+        if self._status_cache and now - self._status_cache[0] < STATUS_CACHE_TTL:
+            return dict(self._status_cache[1])
+        status = self._query_status()
+        self._status_cache = (now, status)
+        return dict(status)
+    
+    def _query_status(self):
+        """Run `wg show` for the VPN interface."""
         try:
             if self.is_testing:
                 result = subprocess.run(['ip', 'netns', 'exec', self.namespace,
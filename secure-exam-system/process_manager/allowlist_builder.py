@@ -4,15 +4,16 @@ Allowlist Builder
 Builds initial process allowlist by scanning system processes.
 """
 
-import psutil
 import logging
 import os
+import re
 import sys
 from pathlib import Path
 
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from config_loader import load_config
 from process_manager.allowlist_manager import AllowlistManager
 
 logging.basicConfig(
@@ -48,43 +49,72 @@ CRITICAL_PROCESSES = [
     'sh',
     'kmod'
 ]
+CRITICAL_SET = frozenset(CRITICAL_PROCESSES)
+
+# Substrings that mark a running process as a system process
+SYSTEM_KEYWORDS = ('systemd', 'dbus', 'network', 'udev', 'journal', 'login', 'session')
+# One alternation matches all keywords in a single pass over the name
+_SYSTEM_KEYWORD_RE = re.compile('|'.join(map(re.escape, SYSTEM_KEYWORDS)))
 
 
 class AllowlistBuilder:
     def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
         """Initialize allowlist builder."""
-        self.manager = AllowlistManager(config_path)
+        # Parse once and share the dict with the manager
+        config = load_config(config_path)
+        self.manager = AllowlistManager(config_path, config=config)
         
         # Load mode from config
-        import json
-        with open(config_path, 'r') as f:
-            config = json.load(f)
         self.mode = config['mode']
         self.exam_app = config.get('process_allowlist', {}).get('exam_app', {})
         
         logger.info(f"Allowlist Builder initialized in {self.mode} mode")
     
-    def scan_running_processes(self):
-        """Scan currently running processes."""
+    def scan_running_processes(self, want_exe=None):
+        """Scan currently running processes.
+        
+        Args:
+            want_exe: Optional predicate on a new process entry; the exe link
+                is only resolved for entries it accepts (default: all)
+        """
         processes = {}
         
-        for proc in psutil.process_iter(['name', 'exe', 'cmdline']):
+        # Walk /proc directly: only comm and the exe link are needed, and
+        # processes whose name was already seen only bump the count
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
             try:
-                pinfo = proc.info
-                name = pinfo['name']
-                exe = pinfo['exe']
-                
-                if name and name not in processes:
-                    processes[name] = {
-                        'name': name,
-                        'exe': exe,
-                        'count': 1
-                    }
-                elif name:
-                    processes[name]['count'] += 1
-                    
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
+                with open(f'/proc/{pid}/comm', 'rb') as f:
+                    name = f.read().rstrip(b'\n').decode('utf-8', 'replace')
+                if len(name) >= 15:
+                    # comm is truncated to 15 chars; recover the full name from
+                    # argv[0] the same way psutil does, so names stay comparable
+                    with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                        argv0 = os.path.basename(f.read().split(b'\0', 1)[0].decode('utf-8', 'replace'))
+                    if argv0.startswith(name):
+                        name = argv0
+            except OSError:
+                continue  # Process exited
+            
+            if not name:
+                continue
+            if name in processes:
+                processes[name]['count'] += 1
+                continue
+            
+            # Lowercased once here for the keyword checks downstream
+            entry = processes[name] = {
+                'name': name,
+                'lname': name.lower(),
+                'exe': None,
+                'count': 1
+            }
+            if want_exe is None or want_exe(entry):
+                try:
+                    entry['exe'] = os.readlink(f'/proc/{pid}/exe')
+                except OSError:
+                    pass  # Kernel thread or not ours to inspect
         
         logger.info(f"Found {len(processes)} unique processes running")
         return processes
@@ -92,11 +122,7 @@ class AllowlistBuilder:
     def add_critical_processes(self):
         """Add critical system processes to allowlist."""
         logger.info("Adding critical system processes...")
-        count = 0
-        
-        for proc_name in CRITICAL_PROCESSES:
-            self.manager.add_process(proc_name)
-            count += 1
+        count = self.manager.add_processes((proc_name, None) for proc_name in CRITICAL_PROCESSES)
         
         logger.info(f"Added {count} critical processes")
         return count
@@ -149,30 +175,35 @@ class AllowlistBuilder:
         
         logger.info("Building process allowlist...")
         
-        # Clear existing allowlist
-        self.manager.clear()
-        
-        # Add critical processes
-        self.add_critical_processes()
-        
-        # Scan running processes to find additional system processes
-        running = self.scan_running_processes()
-        
-        # Auto-add common system processes
-        system_keywords = ['systemd', 'dbus', 'network', 'udev', 'journal', 'login', 'session']
-        auto_added = 0
-        
-        for proc_name, proc_info in running.items():
-            # Check if it's a system process
-            if any(keyword in proc_name.lower() for keyword in system_keywords):
-                if not self.manager.is_allowed(name=proc_name):
-                    self.manager.add_process(proc_name, proc_info['exe'])
-                    auto_added += 1
-        
-        logger.info(f"Auto-added {auto_added} system processes")
-        
-        # Add exam application
-        self.add_exam_app(interactive=interactive_mode)
+        # No intermediate writes while the list is rebuilt
+        self.manager.begin_batch()
+        try:
+            # Clear existing allowlist
+            self.manager.clear()
+            
+            # Add critical processes
+            self.add_critical_processes()
+            
+            # Scan running processes to find additional system processes;
+            # only names that can be auto-added need their exe resolved
+            match_keyword = _SYSTEM_KEYWORD_RE.search
+            running = self.scan_running_processes(
+                want_exe=lambda p: p['name'] not in CRITICAL_SET and match_keyword(p['lname']))
+            
+            # Auto-add common system processes (critical ones were added above)
+            auto_added = self.manager.add_processes(
+                (proc_name, proc_info['exe'])
+                for proc_name, proc_info in running.items()
+                if proc_name not in CRITICAL_SET and match_keyword(proc_info['lname'])
+                and not self.manager.is_allowed(name=proc_name))
+            
+            logger.info(f"Auto-added {auto_added} system processes")
+            
+            # Add exam application
+            self.add_exam_app(interactive=interactive_mode)
+            
+        finally:
+            self.manager.end_batch()
         
         # Save allowlist
         self.manager.save()
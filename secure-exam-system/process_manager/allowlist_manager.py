@@ -8,24 +8,98 @@ import json
 import logging
 import os
 import hashlib
+import pickle
+import stat
+import sys
+import threading
 from pathlib import Path
 from typing import List, Dict, Set
 
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
+
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+    _loads = orjson.loads
+    
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _loads = json.loads
+    
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode()
+
+
+# Reused read buffers for the streaming hash fallback, one per thread
+_hash_buffers = threading.local()
+
+
+def _hash_buffer() -> bytearray:
+    """Return this thread's 1 MiB hashing buffer, allocating it once."""
+    buf = getattr(_hash_buffers, 'buf', None)
+    if buf is None:
+        buf = _hash_buffers.buf = bytearray(1 << 20)
+    return buf
+
+
+class _PrefixTrie:
+    """Path-segment trie answering "is any stored path a prefix of this one?"."""
+    
+    _END = object()  # Marks a node where a stored path ends
+    
+    def __init__(self, paths=()):
+        self._root = {}
+        for path in paths:
+            self.add(path)
+    
+    def add(self, path: str):
+        """Insert a path."""
+        node = self._root
+        for segment in path.rstrip('/').split('/'):
+            node = node.setdefault(segment, {})
+        node[self._END] = True
+    
+    def has_prefix_of(self, path: str) -> bool:
+        """True if the path or one of its parent directories was inserted."""
+        node = self._root
+        for segment in path.split('/'):
+            node = node.get(segment)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
 
 class AllowlistManager:
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config: Dict = None):
         """Initialize allowlist manager."""
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+        if config is None:
+            config = load_config(config_path)
+        self.config = config
         
         self.allowlist_file = Path(__file__).parent.parent / "config" / "process_allowlist.json"
+        # Pickled runtime state, kept next to the JSON it mirrors
+        self.state_file = self.allowlist_file.with_name('.process_allowlist.pkl')
         self.allowlist = {
-            'processes': [],  # List of allowed process names
-            'paths': [],      # List of allowed executable paths
-            'checksums': {}   # Checksums for validation
+            'processes': set(),  # Allowed process names
+            'paths': set(),      # Allowed executable paths
+            'checksums': {}      # Checksums for validation
         }
+        self._reindex()
+        
+        # save() calls are deferred while a batch is open
+        self._batch_depth = 0
+        self._save_pending = False
+        
+        # path -> (stat key, digest); avoids re-hashing unchanged executables
+        self._digest_cache: Dict[str, tuple] = {}
         
         # Load existing allowlist if available
         if self.allowlist_file.exists():
@@ -34,24 +108,108 @@ class AllowlistManager:
         logger.info("Allowlist Manager initialized")
     
     def load(self):
-        """Load allowlist from file."""
+        """Load allowlist from file.
+        
+        The pickled state is used when it matches the JSON file's mtime and
+        size; otherwise the JSON is parsed.
+        """
         try:
-            with open(self.allowlist_file, 'r') as f:
-                self.allowlist = json.load(f)
+            source_stat = os.stat(self.allowlist_file)
+            allowlist = self._load_state(source_stat)
+            if allowlist is None:
+                with open(self.allowlist_file, 'rb') as f:
+                    allowlist = _loads(f.read())
+            self.allowlist = allowlist
+            self._reindex()
             logger.info(f"Loaded allowlist with {len(self.allowlist['processes'])} processes")
             return True
         except Exception as e:
             logger.error(f"Failed to load allowlist: {str(e)}")
             return False
     
+    def _load_state(self, source_stat):
+        """Return the pickled allowlist if it matches the JSON file, else None."""
+        try:
+            with open(self.state_file, 'rb') as f:
+                state_stat = os.fstat(f.fileno())
+                # Only trust state we wrote ourselves and nobody else can
+                # write -- unpickling runs arbitrary code as the current user
+                if (state_stat.st_uid != os.getuid() or
+                        state_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+                    return None
+                state = pickle.load(f)
+        except Exception:
+            return None
+        
+        if (state.get('mtime_ns') == source_stat.st_mtime_ns and
+                state.get('size') == source_stat.st_size):
+            return state.get('allowlist')
+        return None
+    
+    def save_state(self):
+        """Atomically pickle the allowlist, keyed on the current JSON file.
+        
+        Failures are ignored; load() then falls back to the JSON.
+        """
+        tmp_path = self.state_file.with_name(f"{self.state_file.name}.{os.getpid()}.tmp")
+        try:
+            source_stat = os.stat(self.allowlist_file)
+            state = {
+                'mtime_ns': source_stat.st_mtime_ns,
+                'size': source_stat.st_size,
+                'allowlist': self.allowlist,
+            }
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, protocol=5)
+            os.replace(tmp_path, self.state_file)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    
+    def export_json(self, path=None):
+        """Write the human-readable allowlist JSON (default: allowlist_file)."""
+        with open(path or self.allowlist_file, 'wb') as f:
+            f.write(_dumps(self.get_allowlist()))
+    
+    def _reindex(self):
+        """Hold names and paths as sets and rebuild the path trie.
+        
+        The file stores sorted lists; in memory the allowlist dict shares
+        the same set objects, so membership tests are O(1).
+        """
+        self._processes_set = self.allowlist['processes'] = set(self.allowlist['processes'])
+        self._paths_set = self.allowlist['paths'] = set(self.allowlist['paths'])
+        self._path_trie = _PrefixTrie(self._paths_set)
+        # Names and exact paths in one set: names never start with '/', so
+        # one probe per argument answers both exact checks
+        self._combined = self._processes_set | self._paths_set
+    
+    def begin_batch(self):
+        """Defer saves until end_batch(), so bulk edits write the file once."""
+        self._batch_depth += 1
+    
+    def end_batch(self):
+        """Close a batch, writing the file if a save was deferred during it."""
+        self._batch_depth = max(0, self._batch_depth - 1)
+        if self._batch_depth == 0 and self._save_pending:
+            return self.save()
+        return True
+    
     def save(self):
         """Save allowlist to file."""
+        if self._batch_depth:
+            self._save_pending = True
+            return True
+        self._save_pending = False
         try:
             # Ensure directory exists
             self.allowlist_file.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(self.allowlist_file, 'w') as f:
-                json.dump(self.allowlist, f, indent=2)
+            self.export_json()
+            self.save_state()
             logger.info(f"Saved allowlist with {len(self.allowlist['processes'])} processes")
             return True
         except Exception as e:
@@ -60,12 +218,15 @@ class AllowlistManager:
     
     def add_process(self, name: str, path: str = None, compute_checksum: bool = False):
         """Add a process to the allowlist."""
-        if name not in self.allowlist['processes']:
-            self.allowlist['processes'].append(name)
+        if name not in self._processes_set:
+            self._processes_set.add(name)
+            self._combined.add(name)
             logger.info(f"Added process to allowlist: {name}")
         
-        if path and path not in self.allowlist['paths']:
-            self.allowlist['paths'].append(path)
+        if path and path not in self._paths_set:
+            self._paths_set.add(path)
+            self._combined.add(path)
+            self._path_trie.add(path)
             logger.info(f"Added path to allowlist: {path}")
             
             if compute_checksum and os.path.exists(path):
@@ -76,28 +237,51 @@ class AllowlistManager:
         
         return True
     
+    def add_processes(self, entries) -> int:
+        """Add many (name, path) entries at once; path may be None.
+        
+        Same as add_process without checksums, but logs one summary line
+        instead of one or two lines per entry.
+        
+        Returns:
+            Number of entries that added a new name or path
+        """
+        processes, paths, combined = self._processes_set, self._paths_set, self._combined
+        added = 0
+        for name, path in entries:
+            new = name not in processes
+            if new:
+                processes.add(name)
+                combined.add(name)
+            if path and path not in paths:
+                paths.add(path)
+                combined.add(path)
+                self._path_trie.add(path)
+                new = True
+            added += new
+        
+        logger.info(f"Added {added} entries to allowlist")
+        return added
+    
     def remove_process(self, name: str):
         """Remove a process from the allowlist."""
-        if name in self.allowlist['processes']:
-            self.allowlist['processes'].remove(name)
+        if name in self._processes_set:
+            self._processes_set.discard(name)
+            if name not in self._paths_set:
+                self._combined.discard(name)
             logger.info(f"Removed process from allowlist: {name}")
             return True
         return False
     
     def is_allowed(self, name: str = None, path: str = None) -> bool:
         """Check if a process is in the allowlist."""
-        if name and name in self.allowlist['processes']:
+        combined = self._combined
+        if (name and name in combined) or (path and path in combined):
             return True
         
-        if path:
-            # Check exact path
-            if path in self.allowlist['paths']:
-                return True
-            
-            # Check if parent directory matches (for interpreters)
-            for allowed_path in self.allowlist['paths']:
-                if path.startswith(allowed_path):
-                    return True
+        # Check if parent directory matches (for interpreters)
+        if path and self._path_trie.has_prefix_of(path):
+            return True
         
         return False
     
@@ -108,7 +292,7 @@ class AllowlistManager:
             return True  # No checksum to validate
         
         stored_checksum = self.allowlist['checksums'][path]
-        current_checksum = self._compute_checksum(path)
+        current_checksum = self._cached_checksum(path)
         
         if current_checksum == stored_checksum:
             return True
@@ -118,45 +302,76 @@ class AllowlistManager:
             logger.warning(f"  Current: {current_checksum}")
             return False
     
+    def _cached_checksum(self, path: str) -> str:
+        """Checksum of a file, re-hashed only when its stat metadata changes.
+        
+        ctime is part of the key: unlike mtime it cannot be set back by
+        the file's owner, so a rewritten file always misses the cache.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return self._compute_checksum(path)
+        key = (st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+        cached = self._digest_cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        checksum = self._compute_checksum(path)
+        if checksum:
+            self._digest_cache[path] = (key, checksum)
+        return checksum
+    
     def _compute_checksum(self, path: str) -> str:
         """Compute SHA256 checksum of a file."""
         try:
-            sha256 = hashlib.sha256()
-            with open(path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b''):
-                    sha256.update(chunk)
+            # Unbuffered: reads go straight into the hash buffer
+            with open(path, 'rb', buffering=0) as f:
+                if hasattr(hashlib, 'file_digest'):
+                    # Python 3.11+: hashed in C, without the GIL
+                    return hashlib.file_digest(f, 'sha256').hexdigest()
+                sha256 = hashlib.sha256()
+                buf = _hash_buffer()
+                view = memoryview(buf)
+                while n := f.readinto(buf):
+                    sha256.update(view[:n])
             return sha256.hexdigest()
         except Exception as e:
             logger.error(f"Failed to compute checksum for {path}: {str(e)}")
             return ""
     
     def get_allowlist(self) -> Dict:
-        """Get the current allowlist."""
-        return self.allowlist.copy()
+        """Get the current allowlist, with names and paths as sorted lists."""
+        return {
+            'processes': sorted(self._processes_set),
+            'paths': sorted(self._paths_set),
+            'checksums': self.allowlist['checksums'].copy()
+        }
     
     def get_processes(self) -> List[str]:
-        """Get list of allowed process names."""
-        return self.allowlist['processes'].copy()
+        """Get sorted list of allowed process names."""
+        return sorted(self._processes_set)
     
     def get_paths(self) -> List[str]:
-        """Get list of allowed paths."""
-        return self.allowlist['paths'].copy()
+        """Get sorted list of allowed paths."""
+        return sorted(self._paths_set)
     
     def clear(self):
         """Clear the entire allowlist."""
         self.allowlist = {
-            'processes': [],
-            'paths': [],
+            'processes': set(),
+            'paths': set(),
             'checksums': {}
         }
+        self._reindex()
         logger.warning("Allowlist cleared")
     
     def import_system_processes(self, process_list: List[str]):
         """Import a list of system processes."""
         count = 0
         for proc in process_list:
-            if proc not in self.allowlist['processes']:
-                self.allowlist['processes'].append(proc)
+            if proc not in self._processes_set:
+                self._processes_set.add(proc)
+                self._combined.add(proc)
                 count += 1
         
         logger.info(f"Imported {count} system processes to allowlist")
@@ -21,9 +21,10 @@ logger = logging.getLogger(__name__)
 
 
 class ProcessEnforcer(ProcessMonitor):
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config: Dict = None):
         """Initialize process enforcer."""
-        super().__init__(config_path)
+        super().__init__(config_path, config=config)
         self.kill_count = 0
         self.enforcement_enabled = False
         
@@ -84,27 +85,6 @@ class ProcessEnforcer(ProcessMonitor):
         else:
             logger.info("  (Enforcement disabled - logging only)")
     
-    def scan_processes(self):
-        """Scan all running processes and enforce allowlist."""
-        current_pids = set()
-        
-        for proc in psutil.process_iter():
-            try:
-                current_pids.add(proc.pid)
-                
-                # Check if this is a new process
-                if proc.pid not in self.known_pids:
-                    proc_info = self._get_process_info(proc)
-                    
-                    if proc_info and not self._is_process_allowed(proc_info):
-                        self._handle_violation(proc_info)
-                
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-        
-        # Update known PIDs
-        self.known_pids = current_pids
-    
     def enable_enforcement(self):
         """Enable automatic termination of unauthorized processes."""
         self.enforcement_enabled = True
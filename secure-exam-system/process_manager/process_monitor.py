@@ -2,17 +2,23 @@
 """
 Process Monitor
 Monitors all running processes and logs unauthorized process creation.
-Uses userspace /proc monitoring for cross-platform compatibility.
+Uses the Linux proc connector for fork/exec events where available, and
+falls back to polling /proc once a second elsewhere.
 """
 
 import psutil
 import logging
+import os
+import re
+import select
+import socket
+import struct
 import time
 import threading
 import sys
 from pathlib import Path
 from datetime import datetime
-from typing import Set, Dict
+from typing import Dict, Tuple
 
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -21,30 +27,114 @@ from process_manager.allowlist_manager import AllowlistManager
 
 logger = logging.getLogger(__name__)
 
+# Command-line fragments that mark a Python process as an escape attempt
+DANGEROUS_PATTERNS = (
+    'os.system',
+    'subprocess',
+    'import subprocess',
+    'import os',
+    '__import__',
+    'exec(',
+    'eval(',
+    '-c "',
+    "-c '"
+)
+# One alternation finds any of them in a single pass over the command line
+_DANGEROUS_RE = re.compile('|'.join(map(re.escape, DANGEROUS_PATTERNS)))
+
+# Interpreter names checked for the patterns above; anything else with
+# "python" in its name (any case) is matched without lowercasing it
+INTERPRETERS = frozenset({
+    'python', 'python2', 'python3', 'python3.8', 'python3.9', 'python3.10',
+    'python3.11', 'python3.12', 'python3.13', 'pypy', 'pypy3',
+})
+_PYTHON_NAME_RE = re.compile('python', re.IGNORECASE)
+
+# Parent of every kernel thread
+KTHREADD_PID = 2
+
+# Linux: enumerate processes straight from /proc instead of through psutil
+_HAVE_PROCFS = os.path.isdir('/proc/self')
+
+
+def _start_ticks(pid: int) -> int:
+    """Start time of a process in clock ticks since boot (/proc/<pid>/stat).
+    
+    Raises:
+        OSError: if the process is gone
+    """
+    with open(f'/proc/{pid}/stat', 'rb') as f:
+        data = f.read()
+    # comm may contain spaces and parens; fields resume after the last ')'.
+    # starttime is field 22, the 20th after comm.
+    return int(data[data.rindex(b')') + 2:].split(b' ', 20)[19])
+
+
+def _iter_process_keys():
+    """Yield (pid, start time) for every running process."""
+    if not _HAVE_PROCFS:
+        for proc in psutil.process_iter(['create_time'], ad_value=None):
+            yield proc.pid, proc.info['create_time']
+        return
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        try:
+            yield pid, _start_ticks(pid)
+        except (OSError, ValueError, IndexError):
+            continue  # Exited while listing
+
+# Proc connector constants (linux/connector.h, linux/cn_proc.h)
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+PROC_CN_MCAST_LISTEN = 1
+PROC_EVENT_FORK = 0x1
+PROC_EVENT_EXEC = 0x2
+NLMSG_DONE = 3
+# nlmsghdr + cn_msg + proc_event header (what, cpu, timestamp_ns)
+PROC_EVENT_DATA_OFFSET = 16 + 20 + 16
+
+# With proc events, a full scan still runs this often to catch anything
+# the kernel dropped and to forget exited processes
+PROC_RESCAN_INTERVAL = 30.0
+
 
 class ProcessMonitor:
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config: Dict = None):
         """Initialize process monitor."""
-        self.allowlist = AllowlistManager(config_path)
+        self.allowlist = AllowlistManager(config_path, config=config)
         self.monitoring = False
         self.monitor_thread = None
-        self.known_pids: Set[int] = set()
+        # (pid, start time) -> allowed, so a re-seen process is never
+        # re-evaluated and a reused PID is still treated as new
+        self._decision_cache: Dict[Tuple[int, float], bool] = {}
         self.violation_count = 0
         self.baseline_taken = False
+        # Set once the loop is watching for new processes / on each violation
+        self.ready_event = threading.Event()
+        self.violation_event = threading.Event()
+        self._wake_r = self._wake_w = None
+        # exe path -> symlink-resolved path, resolved once per session
+        self._resolved_cache: Dict[str, str] = {}
         
         logger.info("Process Monitor initialized (Red Team Hardened)")
     
     def _get_process_info(self, proc):
         """Get detailed process information."""
         try:
-            return {
-                'pid': proc.pid,
-                'name': proc.name(),
-                'exe': proc.exe(),
-                'cmdline': ' '.join(proc.cmdline()),
-                'username': proc.username(),
-                'create_time': datetime.fromtimestamp(proc.create_time()).isoformat()
-            }
+            with proc.oneshot():
+                return {
+                    'pid': proc.pid,
+                    'ppid': proc.ppid(),
+                    'name': proc.name(),
+                    'exe': proc.exe(),
+                    'cmdline': ' '.join(proc.cmdline()),
+                    'username': proc.username(),
+                    'create_time': datetime.fromtimestamp(proc.create_time()).isoformat()
+                }
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             return None
     
@@ -57,35 +147,30 @@ class ProcessMonitor:
         exe = proc_info['exe']
         cmdline = proc_info.get('cmdline', '')
         
+        # Kernel threads: no executable and parented by kthreadd (PID 2)
+        if not exe and proc_info.get('ppid') == KTHREADD_PID:
+            return True
+        
         # SECURITY PATCH: Detect Python subprocess attacks
-        if 'python' in name.lower():
+        if name in INTERPRETERS or _PYTHON_NAME_RE.search(name):
             # Check if running interactive Python or subprocess tricks
-            dangerous_patterns = [
-                'os.system',
-                'subprocess',
-                'import subprocess',
-                'import os',
-                '__import__',
-                'exec(',
-                'eval(',
-                '-c "',
-                "-c '"
-            ]
-            
-            for pattern in dangerous_patterns:
-                if pattern in cmdline:
-                    logger.error(f"🚨 PYTHON ATTACK DETECTED: {pattern} in {cmdline}")
-                    return False
+            match = _DANGEROUS_RE.search(cmdline)
+            if match:
+                logger.error(f"🚨 PYTHON ATTACK DETECTED: {match.group()} in {cmdline}")
+                return False
         
         # SECURITY PATCH: Resolve symlinks before checking
         if exe:
-            try:
-                resolved_exe = str(Path(exe).resolve())
-                if resolved_exe != exe:
-                    logger.warning(f"Symlink detected: {exe} -> {resolved_exe}")
-                    exe = resolved_exe
-            except:
-                pass
+            resolved_exe = self._resolved_cache.get(exe)
+            if resolved_exe is None:
+                try:
+                    resolved_exe = str(Path(exe).resolve())
+                    self._resolved_cache[exe] = resolved_exe
+                    if resolved_exe != exe:
+                        logger.warning(f"Symlink detected: {exe} -> {resolved_exe}")
+                except:
+                    resolved_exe = exe
+            exe = resolved_exe
         
         # Check allowlist
         if self.allowlist.is_allowed(name=name, path=exe):
@@ -96,35 +181,127 @@ class ProcessMonitor:
     def _log_violation(self, proc_info: Dict):
         """Log a process allowlist violation."""
         self.violation_count += 1
+        self.violation_event.set()
         
-        logger.warning(f"[VIOLATION #{self.violation_count}] Unauthorized process detected:")
-        logger.warning(f"  PID:      {proc_info['pid']}")
-        logger.warning(f"  Name:     {proc_info['name']}")
-        logger.warning(f"  Exe:      {proc_info['exe']}")
-        logger.warning(f"  Cmdline:  {proc_info['cmdline']}")
-        logger.warning(f"  User:     {proc_info['username']}")
-        logger.warning(f"  Started:  {proc_info['create_time']}")
+        # One record per violation, formatted only if WARNING is enabled
+        logger.warning("[VIOLATION #%d] Unauthorized process detected:\n"
+                       "  PID:      %s\n"
+                       "  Name:     %s\n"
+                       "  Exe:      %s\n"
+                       "  Cmdline:  %s\n"
+                       "  User:     %s\n"
+                       "  Started:  %s",
+                       self.violation_count, proc_info['pid'], proc_info['name'],
+                       proc_info['exe'], proc_info['cmdline'], proc_info['username'],
+                       proc_info['create_time'])
+    
+    def _handle_violation(self, proc_info: Dict):
+        """Handle a process allowlist violation."""
+        self._log_violation(proc_info)
     
     def scan_processes(self):
-        """Scan all running processes."""
-        current_pids = set()
+        """Scan all running processes.
+        
+        Only the start time is read for every process; psutil is only
+        used to fetch details for processes not seen before.
+        """
+        decisions = {}
+        
+        for key in _iter_process_keys():
+            allowed = self._decision_cache.get(key)
+            
+            # Check if this is a new process
+            if allowed is None:
+                try:
+                    proc = psutil.Process(key[0])
+                except psutil.Error:
+                    continue  # Exited since it was listed
+                allowed = self._evaluate(proc)
+            
+            decisions[key] = allowed
         
-        for proc in psutil.process_iter():
+        # Forget processes that have exited
+        self._decision_cache = decisions
+    
+    def _evaluate(self, proc) -> bool:
+        """Check one process against the allowlist, handling a violation."""
+        proc_info = self._get_process_info(proc)
+        allowed = self._is_process_allowed(proc_info)
+        if not allowed:
+            self._handle_violation(proc_info)
+        return allowed
+    
+    def _check_pid(self, pid: int, recheck: bool = False):
+        """Evaluate a process reported by a proc event.
+        
+        Args:
+            pid: Process ID from the event
+            recheck: Evaluate even if already decided; exec keeps the PID and
+                create time but replaces the program
+        """
+        try:
+            if _HAVE_PROCFS:
+                key = (pid, _start_ticks(pid))
+                proc = psutil.Process(pid)
+            else:
+                proc = psutil.Process(pid)
+                key = (pid, proc.create_time())
+        except (psutil.Error, OSError, ValueError, IndexError):
+            return  # Already gone
+        if recheck or key not in self._decision_cache:
+            self._decision_cache[key] = self._evaluate(proc)
+    
+    def _open_proc_connector(self):
+        """Subscribe to kernel process events over the proc connector.
+        
+        Returns:
+            The netlink socket, or None if unavailable (not Linux, or no
+            CAP_NET_ADMIN)
+        """
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        except (AttributeError, OSError):
+            return None
+        try:
+            sock.bind((0, CN_IDX_PROC))
+            op = struct.pack('=I', PROC_CN_MCAST_LISTEN)
+            cn_msg = struct.pack('=IIIIHH', CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(op), 0) + op
+            sock.send(struct.pack('=IHHII', 16 + len(cn_msg), NLMSG_DONE, 0, 0, 0) + cn_msg)
+        except OSError:
+            sock.close()
+            return None
+        return sock
+    
+    def _drain_proc_events(self, sock) -> bool:
+        """Handle all queued fork/exec events.
+        
+        Returns:
+            False if the kernel dropped events and a full scan is needed
+        """
+        while True:
             try:
-                current_pids.add(proc.pid)
-                
-                # Check if this is a new process
-                if proc.pid not in self.known_pids:
-                    proc_info = self._get_process_info(proc)
-                    
-                    if proc_info and not self._is_process_allowed(proc_info):
-                        self._log_violation(proc_info)
-                
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-        
-        # Update known PIDs
-        self.known_pids = current_pids
+                data = sock.recv(65536, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return True
+            except OSError:
+                return False  # ENOBUFS: receive queue overflowed
+            
+            offset = 0
+            while offset + 16 <= len(data):
+                msg_len, msg_type = struct.unpack_from('=IH', data, offset)
+                if msg_len < 16:
+                    break
+                data_at = offset + PROC_EVENT_DATA_OFFSET
+                if msg_type == NLMSG_DONE and data_at + 16 <= offset + msg_len:
+                    what = struct.unpack_from('=I', data, data_at - 16)[0]
+                    if what == PROC_EVENT_FORK:
+                        _, _, child_pid, child_tgid = struct.unpack_from('=iiii', data, data_at)
+                        if child_pid == child_tgid:  # New process, not a thread
+                            self._check_pid(child_tgid)
+                    elif what == PROC_EVENT_EXEC:
+                        _, tgid = struct.unpack_from('=ii', data, data_at)
+                        self._check_pid(tgid, recheck=True)
+                offset += (msg_len + 3) & ~3
     
     def take_baseline(self):
         """Take process baseline AFTER security is enabled.
@@ -134,16 +311,11 @@ class ProcessMonitor:
         them in the baseline.
         """
         logger.info("Taking process baseline AFTER security lockdown...")
-        self.known_pids.clear()
-        
-        for proc in psutil.process_iter():
-            try:
-                self.known_pids.add(proc.pid)
-            except:
-                pass
+        self._resolved_cache.clear()
+        self._decision_cache = dict.fromkeys(_iter_process_keys(), True)
         
         self.baseline_taken = True
-        logger.info(f"✓ Baseline: {len(self.known_pids)} processes (POST-LOCKDOWN)")
+        logger.info(f"✓ Baseline: {len(self._decision_cache)} processes (POST-LOCKDOWN)")
     
     def monitor_loop(self):
         """Main monitoring loop."""
@@ -154,10 +326,30 @@ class ProcessMonitor:
             logger.warning("Baseline not taken yet, taking now...")
             self.take_baseline()
         
-        # Monitoring loop
-        while self.monitoring:
-            self.scan_processes()
-            time.sleep(1)  # Check every second
+        events = self._open_proc_connector()
+        self.ready_event.set()
+        if events is None:
+            logger.info("Proc connector unavailable, polling processes every second")
+            while self.monitoring:
+                self.scan_processes()
+                # Check every second; stop() cuts the wait short
+                select.select([self._wake_r], [], [], 1)
+            return
+        
+        # Event-driven loop: new processes are checked as they fork/exec
+        try:
+            last_scan = time.monotonic()
+            while self.monitoring:
+                timeout = max(0.0, last_scan + PROC_RESCAN_INTERVAL - time.monotonic())
+                ready, _, _ = select.select([events, self._wake_r], [], [], timeout)
+                if not self.monitoring:
+                    break
+                lost = events in ready and not self._drain_proc_events(events)
+                if lost or time.monotonic() - last_scan >= PROC_RESCAN_INTERVAL:
+                    self.scan_processes()
+                    last_scan = time.monotonic()
+        finally:
+            events.close()
     
     def start(self):
         """Start process monitoring."""
@@ -172,6 +364,10 @@ class ProcessMonitor:
             logger.error("Allowlist is empty! Please build allowlist first.")
             return False
         
+        # Self-pipe so stop() can wake the loop out of select()
+        self._wake_r, self._wake_w = os.pipe()
+        self.ready_event.clear()
+        
         self.monitoring = True
         self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
         self.monitor_thread.start()
@@ -184,8 +380,14 @@ class ProcessMonitor:
         logger.info("Stopping Process Monitor...")
         
         self.monitoring = False
+        if self._wake_w is not None:
+            os.write(self._wake_w, b'x')
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
+        if self._wake_w is not None:
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
         
         logger.info(f"Process Monitor stopped. Total violations: {self.violation_count}")
         return True
@@ -194,7 +396,7 @@ class ProcessMonitor:
         """Get current monitoring status."""
         return {
             'monitoring': self.monitoring,
-            'known_processes': len(self.known_pids),
+            'known_processes': len(self._decision_cache),
             'violations': self.violation_count,
             'allowlist_size': len(self.allowlist.get_processes())
         }
@@ -7,22 +7,130 @@ Verifies integrity of exam system components.
 import hashlib
 import json
 import logging
+import mmap
 import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List
 
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
+
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+    _loads = orjson.loads
+    
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _loads = json.loads
+    
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode()
+
+# Files are hashed concurrently; hashing releases the GIL, and the reads
+# overlap, so size the pool like ThreadPoolExecutor's I/O default
+MAX_HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Files up to this size are read and hashed in a single call
+SMALL_FILE_SIZE = 64 * 1024
+# Files from this size on are hashed from an mmap of the page cache
+MMAP_FILE_SIZE = 10 * 1024 * 1024
+
+# Digest algorithm for new baselines; INTEGRITY_HASH can name any other
+# hashlib algorithm (e.g. blake2b, which is faster without SHA extensions).
+# Digests of other algorithms are stored as "<algorithm>:<hex>", so an
+# existing baseline always verifies with the algorithm it was made with.
+DEFAULT_HASH = 'sha256'
+
+
+# Files covered by the integrity baseline, relative to the project root
+CRITICAL_FILES = (
+    # Network components
+    "network/vpn_manager.py",
+    "network/domain_filter.py",
+    "network/kiosk_browser.py",
+    # Process management
+    "process_manager/allowlist_manager.py",
+    "process_manager/process_monitor.py",
+    "process_manager/process_enforcer.py",
+    # Security
+    "security/system_lockdown.py",
+    "security/integrity_checker.py",
+    "security/profile_templates/exam_apparmor.profile",
+    # Config
+    "config/system_config.json",
+)
+
+
+# Reused read buffers for the streaming hash fallback, one per thread
+_hash_buffers = threading.local()
+
+
+def _format_digest(hash_name: str, hexdigest: str) -> str:
+    """Stored form of a digest: bare hex for SHA-256, else tagged."""
+    return hexdigest if hash_name == DEFAULT_HASH else f"{hash_name}:{hexdigest}"
+
+
+def _digest_hash_name(digest: str) -> str:
+    """Algorithm a stored digest was made with."""
+    hash_name, sep, _ = digest.partition(':')
+    return hash_name if sep else DEFAULT_HASH
+
+
+def _resolve_hash_name() -> str:
+    """Algorithm for new baselines, from INTEGRITY_HASH if usable."""
+    hash_name = os.environ.get('INTEGRITY_HASH', DEFAULT_HASH).lower()
+    try:
+        hashlib.new(hash_name).hexdigest()  # Rejects unknown and SHAKE names
+    except (ValueError, TypeError):
+        logger.warning(f"Unsupported INTEGRITY_HASH '{hash_name}', using {DEFAULT_HASH}")
+        return DEFAULT_HASH
+    return hash_name
+
+
+def _stat_key(st: os.stat_result) -> tuple:
+    """Identity of a file's contents as far as stat can tell.
+    
+    ctime is included: unlike mtime it cannot be set back by the file's
+    owner, so a rewritten file always gets a new key.
+    """
+    return (st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+def _hash_buffer() -> bytearray:
+    """Return this thread's 1 MiB hashing buffer, allocating it once."""
+    buf = getattr(_hash_buffers, 'buf', None)
+    if buf is None:
+        buf = _hash_buffers.buf = bytearray(1 << 20)
+    return buf
+
 
 class IntegrityChecker:
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config: Dict = None):
         """Initialize integrity checker."""
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+        if config is None:
+            config = load_config(config_path)
+        self.config = config
         
         self.security_config = self.config.get('security', {})
         self.integrity_file = Path(__file__).parent.parent / "config" / "integrity.json"
         self.checksums = {}
+        self.hash_name = _resolve_hash_name()
+        # (full path, algorithm) -> (stat key, checksum) for files hashed this session
+        self._stat_cache = {}
+        
+        # Absolute paths of the critical files, joined once
+        self._project_root = os.fspath(Path(__file__).parent.parent)
+        self._critical_paths = tuple((rel, os.path.join(self._project_root, rel))
+                                     for rel in CRITICAL_FILES)
         
         # Load existing checksums if available
         if self.integrity_file.exists():
@@ -30,23 +138,106 @@ class IntegrityChecker:
         
         logger.info("Integrity Checker initialized")
     
-    def compute_checksum(self, file_path: str) -> str:
-        """Compute SHA256 checksum of a file."""
+    def compute_checksum(self, file_path: str, hash_name: str = None) -> str:
+        """Compute the checksum of a file.
+        
+        Args:
+            file_path: File to hash
+            hash_name: hashlib algorithm; defaults to the checker's
+        
+        Returns:
+            Hex digest, prefixed with "<algorithm>:" unless it is SHA-256,
+            or "" on error
+        """
+        hash_name = hash_name or self.hash_name
         try:
-            sha256 = hashlib.sha256()
-            with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b''):
-                    sha256.update(chunk)
-            return sha256.hexdigest()
+            # Unbuffered: reads go straight into the hash buffer
+            with open(file_path, 'rb', buffering=0) as f:
+                size = os.fstat(f.fileno()).st_size
+                if size <= SMALL_FILE_SIZE:
+                    # Configs and profiles: one read, one update
+                    digest = hashlib.new(hash_name, f.read())
+                elif size >= MMAP_FILE_SIZE:
+                    # Large binaries: no copy out of the page cache at all
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        digest = hashlib.new(hash_name, mm)
+                elif hasattr(hashlib, 'file_digest'):
+                    # Python 3.11+: hashed in C, without the GIL
+                    digest = hashlib.file_digest(f, hash_name)
+                else:
+                    digest = hashlib.new(hash_name)
+                    buf = _hash_buffer()
+                    view = memoryview(buf)
+                    while n := f.readinto(buf):
+                        digest.update(view[:n])
+            return _format_digest(hash_name, digest.hexdigest())
         except Exception as e:
             logger.error(f"Failed to compute checksum for {file_path}: {str(e)}")
             return ""
     
+    def _compute_checksums(self, paths: List[str], hash_names: List[str]) -> List[str]:
+        """Hash several files in parallel, returning checksums in input order."""
+        if not paths:
+            return []
+        self._prefetch(paths)
+        with ThreadPoolExecutor(max_workers=min(MAX_HASH_WORKERS, len(paths))) as ex:
+            return list(ex.map(self.compute_checksum, map(os.fspath, paths), hash_names))
+    
+    def _hash_and_remember(self, full_paths: List[str], stats: List[os.stat_result],
+                           hash_names: List[str]) -> List[str]:
+        """Hash files in parallel, remembering each checksum by stat key."""
+        checksums = self._compute_checksums(full_paths, hash_names)
+        for full_path, st, hash_name, checksum in zip(full_paths, stats, hash_names, checksums):
+            if checksum:
+                self._stat_cache[full_path, hash_name] = (_stat_key(st), checksum)
+        return checksums
+    
+    def _current_checksums(self, full_paths: List[str], stats: List[os.stat_result],
+                           hash_names: List[str]) -> List[str]:
+        """Checksums of files, re-hashing only those whose stat key changed."""
+        current = []
+        stale = []
+        for i, (full_path, st, hash_name) in enumerate(zip(full_paths, stats, hash_names)):
+            cached = self._stat_cache.get((full_path, hash_name))
+            if cached and cached[0] == _stat_key(st):
+                current.append(cached[1])
+            else:
+                current.append(None)
+                stale.append(i)
+        
+        fresh = self._hash_and_remember([full_paths[i] for i in stale],
+                                        [stats[i] for i in stale],
+                                        [hash_names[i] for i in stale])
+        for i, checksum in zip(stale, fresh):
+            current[i] = checksum
+        return current
+    
+    @staticmethod
+    def _prefetch(paths: List[str]):
+        """Queue kernel readahead for all files before any is hashed.
+        
+        On a cold cache this puts every read in the disk queue at once, so
+        the reads overlap instead of each hash waiting for its own I/O.
+        """
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue  # Reported when hashed
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+    
     def load_checksums(self):
         """Load stored checksums."""
         try:
-            with open(self.integrity_file, 'r') as f:
-                self.checksums = json.load(f)
+            with open(self.integrity_file, 'rb') as f:
+                self.checksums = _loads(f.read())
             logger.info(f"Loaded {len(self.checksums)} stored checksums")
         except Exception as e:
             logger.error(f"Failed to load checksums: {str(e)}")
@@ -55,52 +246,124 @@ class IntegrityChecker:
         """Save checksums to file."""
         try:
             self.integrity_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.integrity_file, 'w') as f:
-                json.dump(self.checksums, f, indent=2)
+            with open(self.integrity_file, 'wb') as f:
+                f.write(_dumps(self.checksums))
             logger.info(f"Saved {len(self.checksums)} checksums")
         except Exception as e:
             logger.error(f"Failed to save checksums: {str(e)}")
     
-    def baseline_system(self):
-        """Create baseline checksums for all system components."""
-        logger.info("Creating integrity baseline...")
-        
-        project_root = Path(__file__).parent.parent
-        
-        # Files to check
-        critical_files = [
-            # Network components
-            "network/vpn_manager.py",
-            "network/domain_filter.py",
-            "network/kiosk_browser.py",
-            # Process management
-            "process_manager/allowlist_manager.py",
-            "process_manager/process_monitor.py",
-            "process_manager/process_enforcer.py",
-            # Security
-            "security/system_lockdown.py",
-            "security/integrity_checker.py",
-            "security/profile_templates/exam_apparmor.profile",
-            # Config
-            "config/system_config.json",
-        ]
+    def load_stat_cache(self, path: str) -> int:
+        """Seed the stat cache from a file written by save_stat_cache().
+        
+        Only for private locations such as a test cache dir: a seeded
+        checksum is believed whenever the file's stat key still matches.
+        
+        Returns:
+            Number of entries loaded (0 if the file is missing or invalid)
+        """
+        try:
+            with open(path, 'rb') as f:
+                entries = _loads(f.read())
+            for full_path, hash_name, key, checksum in entries:
+                self._stat_cache[full_path, hash_name] = (tuple(key), checksum)
+        except Exception:
+            return 0
+        return len(entries)
+    
+    def save_stat_cache(self, path: str):
+        """Atomically write the stat cache for a later load_stat_cache()."""
+        entries = [[full_path, hash_name, list(key), checksum]
+                   for (full_path, hash_name), (key, checksum) in self._stat_cache.items()]
+        cache_dir = os.path.dirname(path) or '.'
+        tmp_path = None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.stat_cache.')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_dumps(entries))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to save stat cache: {str(e)}")
+            if tmp_path:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+    
+    def baseline_system(self, trust_cache: bool = False):
+        """Create baseline checksums for all system components.
+        
+        Args:
+            trust_cache: Reuse checksums of files whose stat is unchanged
+                (see load_stat_cache); by default every file is hashed
+        """
+        logger.info(f"Creating integrity baseline ({self.hash_name})...")
         
         self.checksums = {}
         
-        for file_path in critical_files:
-            full_path = project_root / file_path
-            if full_path.exists():
-                checksum = self.compute_checksum(str(full_path))
-                if checksum:
-                    self.checksums[file_path] = checksum
-                    logger.info(f"  ✓ {file_path}")
-            else:
+        present = []
+        full_paths = []
+        stats = []
+        for file_path, full_path in self._critical_paths:
+            try:
+                st = os.stat(full_path)
+            except OSError:
                 logger.warning(f"  ✗ {file_path} not found")
+                continue
+            present.append(file_path)
+            full_paths.append(full_path)
+            stats.append(st)
+        
+        hash_names = [self.hash_name] * len(full_paths)
+        if trust_cache:
+            checksums = self._current_checksums(full_paths, stats, hash_names)
+        else:
+            checksums = self._hash_and_remember(full_paths, stats, hash_names)
+        for file_path, checksum in zip(present, checksums):
+            if checksum:
+                self.checksums[file_path] = checksum
+                logger.info(f"  ✓ {file_path}")
         
         self.save_checksums()
         logger.info(f"Baseline created with {len(self.checksums)} files")
         return True
     
+    def rebaseline(self, file_paths: List[str]) -> bool:
+        """Re-hash only the given files into the baseline and save it.
+        
+        Accepts known edits without re-hashing every component.
+        
+        Args:
+            file_paths: Paths relative to the project root (or absolute)
+        
+        Returns:
+            True if every file was found and hashed
+        """
+        logger.info(f"Re-baselining {len(file_paths)} file(s)...")
+        
+        present = []
+        full_paths = []
+        stats = []
+        for file_path in file_paths:
+            full_path = os.path.join(self._project_root, file_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                logger.warning(f"  ✗ {file_path} not found")
+                continue
+            present.append(file_path)
+            full_paths.append(full_path)
+            stats.append(st)
+        
+        checksums = self._hash_and_remember(full_paths, stats, [self.hash_name] * len(full_paths))
+        for file_path, checksum in zip(present, checksums):
+            if checksum:
+                self.checksums[file_path] = checksum
+                logger.info(f"  ✓ {file_path}")
+        
+        self.save_checksums()
+        return len(present) == len(file_paths) and all(checksums)
+    
     def verify_integrity(self) -> Dict:
         """Verify integrity of all components."""
         logger.info("Verifying system integrity...")
@@ -109,22 +372,33 @@ class IntegrityChecker:
             logger.error("No baseline checksums found. Run baseline_system() first.")
             return {'status': 'error', 'message': 'No baseline'}
         
-        project_root = Path(__file__).parent.parent
         results = {
             'verified': [],
             'modified': [],
             'missing': []
         }
         
-        for file_path, stored_checksum in self.checksums.items():
-            full_path = project_root / file_path
-            
-            if not full_path.exists():
+        known_paths = dict(self._critical_paths)
+        present = []
+        full_paths = []
+        stats = []
+        for file_path in self.checksums:
+            full_path = known_paths.get(file_path) or os.path.join(self._project_root, file_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
                 results['missing'].append(file_path)
                 logger.error(f"✗ MISSING: {file_path}")
                 continue
-            
-            current_checksum = self.compute_checksum(str(full_path))
+            present.append(file_path)
+            full_paths.append(full_path)
+            stats.append(st)
+        
+        # Files untouched since they were last hashed are not read again
+        hash_names = [_digest_hash_name(self.checksums[file_path]) for file_path in present]
+        current = self._current_checksums(full_paths, stats, hash_names)
+        for file_path, current_checksum in zip(present, current):
+            stored_checksum = self.checksums[file_path]
             
             if current_checksum == stored_checksum:
                 results ['verified'].append(file_path)
@@ -6,25 +6,69 @@ Implements critical security fixes identified by red team analysis.
 
 import subprocess
 import os
-import shutil
+import sys
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
+
 logger = logging.getLogger(__name__)
 
+# /tmp entries that cleanup must leave alone: dot entries (.X11-unix,
+# .ICE-unix, ...) and systemd's per-service PrivateTmp dirs
+TMP_KEEP_PREFIXES = ('.', 'systemd-private')
+
+# Environment variables that allow library/module injection
+DANGEROUS_ENV_VARS = frozenset({'LD_PRELOAD', 'LD_LIBRARY_PATH', 'LD_AUDIT', 'PYTHONPATH', 'PERL5LIB'})
+
+# Command lines, built once; xsel takes one selection per run
+_RM_ARGS = ('rm', '-rf', '--')
+_XSEL_CLEAR_ARGS = (('xsel', '-bc'), ('xsel', '-pc'), ('xsel', '-sc'))
+_XCLIP_CLEAR_ARGS = ('xclip', '-selection', 'clipboard', '/dev/null')
+
+
+def _remove_trees(paths, parallel=False):
+    """Remove files and directory trees with `rm -rf`.
+    
+    By default one rm handles every path. With parallel=True each path
+    gets its own rm and they all run at once, for a few large trees
+    whose deletion is bound by syscall latency. rm's complaints are
+    logged as warnings.
+    
+    Returns:
+        The paths that are gone afterwards
+    """
+    if not paths:
+        return []
+    batches = [[path] for path in paths] if parallel else [paths]
+    procs = [subprocess.Popen((*_RM_ARGS, *batch), stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, text=True)
+             for batch in batches]
+    for proc in procs:
+        _, errors = proc.communicate()
+        for line in errors.splitlines():
+            logger.warning(f"  {line}")
+    return [path for path in paths if not os.path.lexists(path)]
+
 
 class SecurityPatcher:
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config=None):
         """Initialize security patcher."""
-        import json
-        try:
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            self.mode = config.get('mode', 'testing')
-        except:
-            self.mode = 'testing'  # Default to safe mode
+        if config is None:
+            try:
+                config = load_config(config_path)
+            except:
+                config = {}
+        self.mode = config.get('mode', 'testing')  # Default to safe mode
         
         self.patches_applied = []
+        self._applied_lock = threading.Lock()
         logger.info(f"Security Patcher initialized (mode: {self.mode})")
     
     def clear_environment_variables(self):
@@ -34,20 +78,11 @@ class SecurityPatcher:
         """
         logger.info("Applying PATCH #1: Environment variable sanitization")
         
-        dangerous_vars = [
-            'LD_PRELOAD',
-            'LD_LIBRARY_PATH',
-            'LD_AUDIT',
-            'PYTHONPATH',
-            'PERL5LIB'
-        ]
+        cleared = [var for var in DANGEROUS_ENV_VARS if os.environ.pop(var, None) is not None]
+        if cleared:
+            logger.info(f"  Cleared {', '.join(sorted(cleared))}")
         
-        for var in dangerous_vars:
-            if var in os.environ:
-                del os.environ[var]
-                logger.info(f"  Cleared {var}")
-        
-        self.patches_applied.append("environment_sanitization")
+        self._mark_applied("environment_sanitization")
         logger.info("✓ Environment sanitized")
         return True
     
@@ -59,26 +94,27 @@ class SecurityPatcher:
         logger.info("Applying PATCH #2: /tmp directory cleanup")
         
         try:
-            tmp_path = Path("/tmp")
-            
-            # Get list of files (exclude system files)
-            excluded = ['systemd-private', '.X11-unix', '.XIM-unix',  '.font-unix', '.ICE-unix']
-            
             count = 0
-            for item in tmp_path.iterdir():
-                if item.name not in excluded and not item.name.startswith('.'):
-                    try:
-                        if item.is_file():
-                            item.unlink()
-                            count += 1
-                        elif item.is_dir():
-                            shutil.rmtree(item)
+            dirs = []
+            # scandir's d_type answers the type checks without a stat per entry
+            with os.scandir('/tmp') as it:
+                for entry in it:
+                    if entry.name.startswith(TMP_KEEP_PREFIXES):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif entry.is_file() or entry.is_dir():
+                        # Plain files and symlinks are one unlink each
+                        try:
+                            os.unlink(entry.path)
                             count += 1
-                    except (PermissionError, OSError) as e:
-                        logger.warning(f"  Could not remove {item}: {e}")
+                        except OSError as e:
+                            logger.warning(f"  Could not remove {entry.path}: {e}")
             
+            # Only real directory trees need rm; one process handles them all
+            count += len(_remove_trees(dirs))
             logger.info(f"  Cleaned {count} items from /tmp")
-            self.patches_applied.append("tmp_cleanup")
+            self._mark_applied("tmp_cleanup")
             logger.info("✓ /tmp cleaned")
             return True
             
@@ -93,25 +129,23 @@ class SecurityPatcher:
         """
         logger.info("Applying PATCH #3: Browser cache cleanup")
         
+        home = str(Path.home())
         cache_paths = [
-            Path.home() / ".cache/chromium",
-            Path.home() / ".config/chromium/Default/Cache",
-            Path.home() / ".cache/google-chrome",
-            Path.home() / ".mozilla/firefox",
+            os.path.join(home, ".cache/chromium"),
+            os.path.join(home, ".config/chromium/Default/Cache"),
+            os.path.join(home, ".cache/google-chrome"),
+            os.path.join(home, ".mozilla/firefox"),
         ]
         
-        count = 0
-        for cache_path in cache_paths:
-            if cache_path.exists():
-                try:
-                    shutil.rmtree(cache_path)
-                    count += 1
-                    logger.info(f"  Cleared {cache_path}")
-                except Exception as e:
-                    logger.warning(f"  Could not clear {cache_path}: {e}")
-        
-        self.patches_applied.append("browser_cache_clear")
-        logger.info(f"✓ Cleared {count} browser caches")
+        # One lstat per path: spawning rm for a missing cache costs more
+        existing = [p for p in cache_paths if os.path.lexists(p)]
+        # Caches are deep trees of small files; delete them side by side
+        cleared = _remove_trees(existing, parallel=True)
+        for cache_path in cleared:
+            logger.info(f"  Cleared {cache_path}")
+        
+        self._mark_applied("browser_cache_clear")
+        logger.info(f"✓ Cleared {len(cleared)} browser caches")
         return True
     
     def clear_clipboard(self):
@@ -121,24 +155,32 @@ class SecurityPatcher:
         """
         logger.info("Applying PATCH #4: Clipboard cleanup")
         
+        cleared = False
         try:
-            # Try xsel
-            subprocess.run(['xsel', '-bc'], capture_output=True, timeout=2)
-            subprocess.run(['xsel', '-pc'], capture_output=True, timeout=2)
-            subprocess.run(['xsel', '-sc'], capture_output=True, timeout=2)
+            # Try xsel: it takes one selection per run, so clear clipboard,
+            # primary and secondary concurrently rather than one after another
+            procs = [subprocess.Popen(args, stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL)
+                     for args in _XSEL_CLEAR_ARGS]
+            for proc in procs:
+                try:
+                    proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+            cleared = True
             logger.info("  Cleared clipboard (xsel)")
         except:
             pass
         
-        try:
-            # Try xclip
-            subprocess.run(['xclip', '-selection', 'clipboard', '/dev/null'], 
-                          capture_output=True, timeout=2, stdin=subprocess.DEVNULL)
-            logger.info("  Cleared clipboard (xclip)")
-        except:
-            pass
+        if not cleared:
+            try:
+                # Fall back to xclip
+                subprocess.run(_XCLIP_CLEAR_ARGS, capture_output=True, timeout=2, stdin=subprocess.DEVNULL)
+                logger.info("  Cleared clipboard (xclip)")
+            except:
+                pass
         
-        self.patches_applied.append("clipboard_clear")
+        self._mark_applied("clipboard_clear")
         logger.info("✓ Clipboard cleared")
         return True
     
@@ -155,7 +197,7 @@ class SecurityPatcher:
         # SKIP in testing mode - can cause console switching issues
         if self.mode == 'testing':
             logger.info("  ⊘ Skipped in testing mode (production only)")
-            self.patches_applied.append("vt_lockdown_skipped")
+            self._mark_applied("vt_lockdown_skipped")
             return True
         
         try:
@@ -176,7 +218,7 @@ class SecurityPatcher:
             # - AppArmor/SELinux preventing chvt access
             # - Physical keyboard lock in production
             
-            self.patches_applied.append("vt_lockdown")
+            self._mark_applied("vt_lockdown")
             logger.info("✓ Virtual console switching mitigation applied")
             logger.info("  (Full lockdown requires AppArmor + kiosk browser)")
             return True
@@ -186,28 +228,43 @@ class SecurityPatcher:
             logger.warning("(VT blocking requires kernel-level access)")
             return False
     
+    def _mark_applied(self, name):
+        """Record an applied patch; patches may run concurrently."""
+        with self._applied_lock:
+            self.patches_applied.append(name)
+    
+    def _run_patch(self, patch):
+        """Run one patch, turning an exception into a failed result."""
+        try:
+            return patch()
+        except Exception as e:
+            logger.error(f"{patch.__name__} failed: {e}")
+            return False
+    
     def apply_all_patches(self):
         """Apply all critical security patches."""
         logger.info("\n" + "="*60)
         logger.info("APPLYING CRITICAL SECURITY PATCHES")
         logger.info("="*60 + "\n")
         
+        # The environment is sanitized first, on its own: the other patches
+        # spawn subprocesses that would otherwise inherit LD_PRELOAD & co.
         patches = [
-            self.clear_environment_variables,
             self.clear_tmp_directory,
             self.clear_browser_cache,
             self.clear_clipboard,
             self.disable_virtual_consoles,
         ]
         
-        results = []
-        for patch in patches:
-            try:
-                result = patch()
-                results.append(result)
-            except Exception as e:
-                logger.error(f"{patch.__name__} failed: {e}")
-                results.append(False)
+        results = [self._run_patch(self.clear_environment_variables)]
+        if not results[0]:
+            # Every later patch would run with the unsanitized environment
+            logger.error(f"Environment sanitization failed - skipping the remaining {len(patches)} patches")
+            return False
+        
+        # The rest touch disjoint resources and mostly wait on I/O
+        with ThreadPoolExecutor(max_workers=len(patches)) as ex:
+            results.extend(ex.map(self._run_patch, patches))
         
         success_count = sum(results)
         total = len(results)
@@ -8,17 +8,35 @@ import subprocess
 import logging
 import os
 import shutil
+import sys
 from pathlib import Path
 
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_loader import load_config
+
 logger = logging.getLogger(__name__)
 
+APPARMOR_ENABLED_PATH = '/sys/module/apparmor/parameters/enabled'
+APPARMOR_SECURITYFS = '/sys/kernel/security/apparmor'
+
+# load_profile's parser + enforce chain; the profile path is passed as $1,
+# any further arguments are extra apparmor_parser options
+_ENFORCE_FAILED = 11
+_LOAD_AND_ENFORCE = ('p=$1; shift; apparmor_parser -r "$@" -- "$p" || exit 10; '
+                     f'aa-enforce "$p" || exit {_ENFORCE_FAILED}')
+_LOAD_AND_ENFORCE_ARGS = ('sh', '-c', _LOAD_AND_ENFORCE, 'sh')
+_APPARMOR_REMOVE_ARGS = ('apparmor_parser', '-R', '--')
+
 
 class SystemLockdown:
-    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json"):
+    def __init__(self, config_path="/home/savvy19/Desktop/product/secure-exam-system/config/system_config.json",
+                 config=None):
         """Initialize system lockdown manager."""
-        import json
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+        if config is None:
+            config = load_config(config_path)
+        self.config = config
         
         self.security_config = self.config.get('security', {})
         self.use_apparmor = self.security_config.get('use_apparmor', True)
@@ -27,24 +45,41 @@ class SystemLockdown:
         self.profile_dir = Path(__file__).parent / "profile_templates"
         self.profile_file = self.profile_dir / "exam_apparmor.profile"
         self.system_profile_path = Path(f"/etc/apparmor.d/{self.profile_name}")
+        self._system_profile_str = str(self.system_profile_path)
+        
+        # Compiled policy is cached here, so reloading an unchanged profile
+        # skips the compile; unset leaves the parser's own cache settings
+        self.apparmor_cache_dir = os.environ.get('APPARMOR_CACHE_DIR')
+        self._parser_args = (('--write-cache', '--cache-loc', self.apparmor_cache_dir)
+                             if self.apparmor_cache_dir else ())
         
         self.profile_loaded = False
+        # AppArmor availability does not change during an exam; checked once
+        self._apparmor_active = None
         
         logger.info("System Lockdown Manager initialized")
     
     def check_apparmor_status(self):
-        """Check if AppArmor is installed and running."""
-        try:
-            result = subprocess.run(['aa-status'], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info("AppArmor is active")
-                return True
-            else:
-                logger.warning("AppArmor is not active")
-                return False
-        except FileNotFoundError:
+        """Check if AppArmor is installed and running (cached after the first call)."""
+        if self._apparmor_active is None:
+            self._apparmor_active = self._query_apparmor_status()
+        return self._apparmor_active
+    
+    def _query_apparmor_status(self):
+        """Ask the kernel directly instead of forking aa-status."""
+        if shutil.which('apparmor_parser') is None:
             logger.error("AppArmor is not installed")
             return False
+        try:
+            with open(APPARMOR_ENABLED_PATH) as f:
+                enabled = f.read(1) == 'Y'
+        except OSError:
+            enabled = False
+        if enabled and os.path.isdir(APPARMOR_SECURITYFS):
+            logger.info("AppArmor is active")
+            return True
+        logger.warning("AppArmor is not active")
+        return False
     
     def load_profile(self):
         """Load AppArmor profile for exam mode."""
@@ -60,20 +95,21 @@ class SystemLockdown:
             logger.info("Loading AppArmor profile for exam mode...")
             
             # Copy profile to system location
-            logger.info(f"Copying profile to {self.system_profile_path}")
-            shutil.copy(self.profile_file, self.system_profile_path)
+            logger.info(f"Copying profile to {self._system_profile_str}")
+            shutil.copy(self.profile_file, self._system_profile_str)
+            
+            if self.apparmor_cache_dir:
+                os.makedirs(self.apparmor_cache_dir, exist_ok=True)
             
-            # Load the profile
-            result = subprocess.run(['apparmor_parser', '-r', str(self.system_profile_path)],
+            # Load the profile and set it to enforce mode in one shell; the
+            # exit status tells which stage failed
+            result = subprocess.run(_LOAD_AND_ENFORCE_ARGS + (self._system_profile_str,) + self._parser_args,
                                    capture_output=True, text=True)
             
-            if result.returncode == 0:
+            if result.returncode in (0, _ENFORCE_FAILED):
                 logger.info("✓ AppArmor profile loaded successfully")
                 self.profile_loaded = True
                 
-                # Set profile to enforce mode
-                result = subprocess.run(['aa-enforce', str(self.system_profile_path)],
-                                       capture_output=True, text=True)
                 if result.returncode == 0:
                     logger.info("✓ AppArmor profile set to enforce mode")
                 
@@ -95,16 +131,18 @@ class SystemLockdown:
             logger.info("Unloading AppArmor profile...")
             
             # Unload the profile
-            result = subprocess.run(['apparmor_parser', '-R', str(self.system_profile_path)],
+            result = subprocess.run(_APPARMOR_REMOVE_ARGS + (self._system_profile_str,),
                                    capture_output=True, text=True)
             
             if result.returncode == 0 or 'does not exist' in result.stderr:
                 logger.info("✓ AppArmor profile unloaded")
                 
                 # Remove system profile file
-                if self.system_profile_path.exists():
-                    self.system_profile_path.unlink()
-                    logger.info(f"✓ Removed {self.system_profile_path}")
+                try:
+                    os.unlink(self._system_profile_str)
+                    logger.info(f"✓ Removed {self._system_profile_str}")
+                except FileNotFoundError:
+                    pass
                 
                 self.profile_loaded = False
                 return True
@@ -9,6 +9,7 @@ import logging
 import json
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Add parent directory to path
@@ -27,24 +28,19 @@ logger = logging.getLogger(__name__)
 
 
 class Phase2Tests:
-    def __init__(self):
-        self.results = []
-    
     def test(self, name, func):
-        """Run a test and record result."""
+        """Run a test and return its (name, passed, error) result."""
         logger.info(f"\n{'='*60}")
         logger.info(f"TEST: {name}")
         logger.info(f"{'='*60}")
         
         try:
             result = func()
-            self.results.append((name, result, ""))
             logger.info(f"✓ {name} - {'PASSED' if result else 'FAILED'}")
-            return result
+            return (name, result, "")
         except Exception as e:
             logger.error(f"✗ {name} - FAILED with exception: {str(e)}")
-            self.results.append((name, False, str(e)))
-            return False
+            return (name, False, str(e))
     
     def test_vpn_creation(self):
         """Test VPN manager initialization and namespace creation."""
@@ -124,39 +120,46 @@ class Phase2Tests:
             return status is not None
         return False
     
+    def _run_tests(self):
+        """Run the Phase 2 tests, yielding each result as it completes.
+        
+        Results are yielded in a fixed order even for tests run concurrently.
+        """
+        # Namespace creation, IP resolution and the monitor touch disjoint
+        # subsystems and mostly wait on the kernel/network, so run them at once
+        logger.info("\n=== VPN / DOMAIN FILTER / NETWORK MONITOR TESTS (concurrent) ===")
+        independent = (
+            ("VPN Namespace Creation", self.test_vpn_creation),
+            ("Domain Filter Initialization", self.test_domain_filter_init),
+            ("Network Monitor", self.test_network_monitor),
+        )
+        with ThreadPoolExecutor(max_workers=len(independent)) as pool:
+            yield from pool.map(lambda case: self.test(*case), independent)
+        
+        # These need the namespace and resolved IPs, so they run in order
+        logger.info("\n=== KILL SWITCH / IPTABLES TESTS ===")
+        yield self.test("VPN Kill Switch Configuration", self.test_kill_switch)
+        yield self.test("Domain Filter iptables Rules", self.test_domain_filter_rules)
+    
     def run_all_tests(self):
         """Run all Phase 2 tests."""
         logger.info(f"\n{'#'*60}")
         logger.info("PHASE 2: NETWORK SECURITY TESTS")
         logger.info(f"{'#'*60}\n")
         
-        # VPN Tests
-        logger.info("\n=== VPN TESTS ===")
-        self.test("VPN Namespace Creation", self.test_vpn_creation)
-        self.test("VPN Kill Switch Configuration", self.test_kill_switch)
-        
-        # Domain Filter Tests
-        logger.info("\n=== DOMAIN FILTER TESTS ===")
-        self.test("Domain Filter Initialization", self.test_domain_filter_init)
-        self.test("Domain Filter iptables Rules", self.test_domain_filter_rules)
-        
-        # Network Monitor Tests
-        logger.info("\n=== NETWORK MONITOR TESTS ===")
-        self.test("Network Monitor", self.test_network_monitor)
-        
-        # Print summary
-        self.print_summary()
+        return self.print_summary(self._run_tests())
     
-    def print_summary(self):
-        """Print test summary."""
+    def print_summary(self, results):
+        """Consume (name, passed, error) results and print the summary."""
+        rows = list(results)
+        passed = sum(1 for _, result, _ in rows if result)
+        total = len(rows)
+        
         logger.info(f"\n{'#'*60}")
         logger.info("TEST SUMMARY")
         logger.info(f"{'#'*60}\n")
         
-        passed = sum(1 for _, result, _ in self.results if result)
-        total = len(self.results)
-        
-        for name, result, error in self.results:
+        for name, result, error in rows:
             status = "✓ PASS" if result else "✗ FAIL"
             logger.info(f"{status}: {name}")
             if error:
@@ -6,7 +6,6 @@ Tests allowlist management, process monitoring, and enforcement.
 
 import sys
 import logging
-import time
 import subprocess
 from pathlib import Path
 
@@ -26,24 +25,19 @@ logger = logging.getLogger(__name__)
 
 
 class Phase3Tests:
-    def __init__(self):
-        self.results = []
-    
     def test(self, name, func):
-        """Run a test and record result."""
+        """Run a test and return its (name, passed, error) result."""
         logger.info(f"\n{'='*60}")
         logger.info(f"TEST: {name}")
         logger.info(f"{'='*60}")
         
         try:
             result = func()
-            self.results.append((name, result, ""))
             logger.info(f"✓ {name} - {'PASSED' if result else 'FAILED'}")
-            return result
+            return (name, result, "")
         except Exception as e:
             logger.error(f"✗ {name} - FAILED with exception: {str(e)}")
-            self.results.append((name, False, str(e)))
-            return False
+            return (name, False, str(e))
     
     def test_allowlist_manager(self):
         """Test allowlist manager basic operations."""
@@ -58,6 +52,11 @@ class Phase3Tests:
         if am.is_allowed(name="test_proc"):
             return False
         
+        # Test bulk add
+        am.add_processes([("bulk_proc_a", None), ("bulk_proc_b", "/opt/bulk/bin/b")])
+        if not (am.is_allowed(name="bulk_proc_a") and am.is_allowed(path="/opt/bulk/bin/b")):
+            return False
+        
         return True
     
     def test_allowlist_builder(self):
@@ -87,8 +86,10 @@ class Phase3Tests:
         if not monitor.start():
             return False
         
-        # Let it run briefly
-        time.sleep(2)
+        # Wait for the loop to come up
+        if not monitor.ready_event.wait(timeout=5):
+            monitor.stop()
+            return False
         
         # Check status
         status = monitor.get_status()
@@ -108,19 +109,17 @@ class Phase3Tests:
         if not monitor.start():
             return False
         
-        # Give it a moment to establish baseline
-        time.sleep(1)
+        # Wait until the baseline is taken and new processes are watched
+        if not monitor.ready_event.wait(timeout=5):
+            monitor.stop()
+            return False
         
         # Start an unauthorized process (sleep command)
         logger.info("Starting test process (sleep)...")
         proc = subprocess.Popen(['sleep', '5'])
         
         # Wait for detection
-        time.sleep(2)
-        
-        # Check if violation was logged
-        status = monitor.get_status()
-        detected = status['violations'] > 0
+        detected = monitor.violation_event.wait(timeout=3.0)
         
         # Cleanup
         proc.terminate()
@@ -134,35 +133,37 @@ class Phase3Tests:
         
         return detected
     
-    def run_all_tests(self):
-        """Run all Phase 3 tests."""
-        logger.info(f"\n{'#'*60}")
-        logger.info("PHASE 3: PROCESS MANAGEMENT TESTS")
-        logger.info(f"{'#'*60}\n")
-        
+    def _run_tests(self):
+        """Run the Phase 3 tests in order, yielding each result as it completes."""
         # Allowlist Tests
         logger.info("\n=== ALLOWLIST TESTS ===")
-        self.test("Allowlist Manager Operations", self.test_allowlist_manager)
-        self.test("Allowlist Builder", self.test_allowlist_builder)
+        yield self.test("Allowlist Manager Operations", self.test_allowlist_manager)
+        yield self.test("Allowlist Builder", self.test_allowlist_builder)
         
         # Process Monitoring Tests
         logger.info("\n=== PROCESS MONITORING TESTS ===")
-        self.test("Process Monitor Start/Stop", self.test_process_monitor)
-        self.test("Unauthorized Process Detection", self.test_process_detection)
+        yield self.test("Process Monitor Start/Stop", self.test_process_monitor)
+        yield self.test("Unauthorized Process Detection", self.test_process_detection)
+    
+    def run_all_tests(self):
+        """Run all Phase 3 tests."""
+        logger.info(f"\n{'#'*60}")
+        logger.info("PHASE 3: PROCESS MANAGEMENT TESTS")
+        logger.info(f"{'#'*60}\n")
         
-        # Print summary
-        self.print_summary()
+        return self.print_summary(self._run_tests())
     
-    def print_summary(self):
-        """Print test summary."""
+    def print_summary(self, results):
+        """Consume (name, passed, error) results and print the summary."""
+        rows = list(results)
+        passed = sum(1 for _, result, _ in rows if result)
+        total = len(rows)
+        
         logger.info(f"\n{'#'*60}")
         logger.info("TEST SUMMARY")
         logger.info(f"{'#'*60}\n")
         
-        passed = sum(1 for _, result, _ in self.results if result)
-        total = len(self.results)
-        
-        for name, result, error in self.results:
+        for name, result, error in rows:
             status = "✓ PASS" if result else "✗ FAIL"
             logger.info(f"{status}: {name}")
             if error:
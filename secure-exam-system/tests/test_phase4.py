@@ -4,48 +4,88 @@ Phase 4 Security Hardening Tests
 Tests AppArmor profile loading and integrity checking.
 """
 
+import os
+import shutil
+import subprocess
 import sys
 import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
 
 # Add parent to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+_ROOT = str(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, _ROOT)
 
 from security.system_lockdown import SystemLockdown
-from security.integrity_checker import IntegrityChecker
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from security.integrity_checker import IntegrityChecker, MMAP_FILE_SIZE
 
 logger = logging.getLogger(__name__)
 
+_BAR = '=' * 60
+_HASH_BAR = '#' * 60
+
+# Checksums of unchanged files are carried over between runs from here
+_STAT_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                           'secure-cp', 'phase4_baseline.json')
+
 
 class Phase4Tests:
     def __init__(self):
         self.results = []
+        self._results_lock = threading.Lock()
+        # Set once test_integrity_baseline has baselined self.checker
+        self.baselined = False
+    
+    # Shared by all tests; created on first use so a construction error
+    # fails the test that hit it instead of the whole run
+    @cached_property
+    def lockdown(self):
+        return SystemLockdown()
+    
+    @cached_property
+    def checker(self):
+        # The tests only need to catch changes made seconds apart, not
+        # tampering; BLAKE2b outruns SHA-256 on CPUs without SHA extensions.
+        # The variable is only set while the checker picks its algorithm.
+        saved = os.environ.get("INTEGRITY_HASH")
+        os.environ["INTEGRITY_HASH"] = "blake2b"
+        try:
+            checker = IntegrityChecker()
+        finally:
+            if saved is None:
+                del os.environ["INTEGRITY_HASH"]
+            else:
+                os.environ["INTEGRITY_HASH"] = saved
+        # Baseline into a scratch file, never over config/integrity.json
+        self._scratch = tempfile.TemporaryDirectory()
+        checker.integrity_file = Path(self._scratch.name) / "integrity.json"
+        checker.checksums = {}
+        return checker
     
     def test(self, name, func):
         """Run a test and record result."""
-        logger.info(f"\n{'='*60}")
-        logger.info(f"TEST: {name}")
-        logger.info(f"{'='*60}")
+        # One record, formatted only if INFO is enabled
+        logger.info("\n%s\nTEST: %s\n%s", _BAR, name, _BAR)
         
         try:
             result = func()
-            self.results.append((name, result, ""))
-            logger.info(f"✓ {name} - {'PASSED' if result else 'FAILED'}")
+            with self._results_lock:
+                self.results.append((name, result, ""))
+            logger.info("✓ %s - %s", name, 'PASSED' if result else 'FAILED')
             return result
         except Exception as e:
-            logger.error(f"✗ {name} - FAILED with exception: {str(e)}")
-            self.results.append((name, False, str(e)))
+            logger.error("✗ %s - FAILED with exception: %s", name, e)
+            # The exception itself; it is only turned into text if logged
+            with self._results_lock:
+                self.results.append((name, False, e))
             return False
     
     def test_apparmor_check(self):
         """Test AppArmor status check."""
-        lockdown = SystemLockdown()
-        status = lockdown.check_apparmor_status()
+        status = self.lockdown.check_apparmor_status()
         
         if status:
             logger.info("AppArmor is available")
@@ -57,20 +97,34 @@ class Phase4Tests:
     
     def test_profile_exists(self):
         """Test that AppArmor profile file exists."""
-        lockdown = SystemLockdown()
+        lockdown = self.lockdown
         
-        if lockdown.profile_file.exists():
-            logger.info(f"Profile found: {lockdown.profile_file}")
-            return True
-        else:
+        if not lockdown.profile_file.exists():
             logger.error(f"Profile not found: {lockdown.profile_file}")
             return False
+        logger.info(f"Profile found: {lockdown.profile_file}")
+        
+        # Compile every template in one parser run without loading it into
+        # the kernel (-Q) or touching the cache (-K); needs AppArmor tools
+        if shutil.which('apparmor_parser'):
+            profiles = sorted(str(p) for p in lockdown.profile_dir.glob('*.profile'))
+            result = subprocess.run(['apparmor_parser', '-Q', '-K', '--', *profiles],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                logger.error(f"Profile does not compile: {result.stderr}")
+                return False
+            logger.info(f"Compiled {len(profiles)} profile(s)")
+        
+        return True
     
     def test_integrity_baseline(self):
         """Test integrity baseline creation."""
-        checker = IntegrityChecker()
+        checker = self.checker
         
-        result = checker.baseline_system()
+        checker.load_stat_cache(_STAT_CACHE)
+        result = checker.baseline_system(trust_cache=True)
+        checker.save_stat_cache(_STAT_CACHE)
+        self.baselined = result
         
         if result and len(checker.checksums) > 0:
             logger.info(f"Baseline created with {len(checker.checksums)} files")
@@ -81,12 +135,14 @@ class Phase4Tests:
     
     def test_integrity_verify(self):
         """Test integrity verification."""
-        checker = IntegrityChecker()
+        checker = self.checker
         
-        # Create baseline first
-        checker.baseline_system()
+        # Create baseline first, unless the baseline test already did
+        if not self.baselined:
+            checker.baseline_system()
         
-        # Verify integrity
+        # Verify integrity; files untouched since the baseline are matched
+        # by stat alone, so they are not read a second time
         results = checker.verify_integrity()
         
         if results['status'] == 'ok':
@@ -96,10 +152,42 @@ class Phase4Tests:
             logger.error(f"Integrity check failed: {results['summary']}")
             return False
     
+    def test_integrity_rebaseline(self):
+        """Test that an edited file is caught and can be re-baselined alone.
+        
+        The file is MMAP_FILE_SIZE bytes, so it is hashed through the mmap path.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            checker = IntegrityChecker()
+            checker.integrity_file = Path(tmp) / "integrity.json"
+            checker.checksums = {}
+            
+            target = os.path.join(tmp, "data.bin")
+            with open(target, 'wb') as f:
+                f.write(os.urandom(MMAP_FILE_SIZE))
+            if not checker.rebaseline([target]):
+                return False
+            
+            # Flip one byte in the middle
+            with open(target, 'r+b') as f:
+                f.seek(MMAP_FILE_SIZE // 2)
+                byte = f.read(1)[0]
+                f.seek(MMAP_FILE_SIZE // 2)
+                f.write(bytes([byte ^ 0xFF]))
+            # Same size, and on coarse-timestamp filesystems possibly the
+            # same mtime: move it on so the stat cache cannot match
+            st = os.stat(target)
+            os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+            if checker.verify_integrity()['status'] != 'compromised':
+                logger.error("Edit was not detected")
+                return False
+            
+            checker.rebaseline([target])
+            return checker.verify_integrity()['status'] == 'ok'
+    
     def test_lockdown_status(self):
         """Test lockdown status retrieval."""
-        lockdown = SystemLockdown()
-        status = lockdown.get_status()
+        status = self.lockdown.get_status()
         
         if 'apparmor_active' in status and 'profile_loaded' in status:
             logger.info(f"Status retrieved: {status}")
@@ -108,52 +196,73 @@ class Phase4Tests:
             logger.error("Failed to get status")
             return False
     
+    def _run_group(self, tests):
+        """Run (name, func) tests one after another."""
+        for name, func in tests:
+            self.test(name, func)
+    
     def run_all_tests(self):
         """Run all Phase 4 tests."""
-        logger.info(f"\n{'#'*60}")
-        logger.info("PHASE 4: SECURITY HARDENING TESTS")
-        logger.info(f"{'#'*60}\n")
-        
-        # AppArmor Tests
-        logger.info("\n=== APPARMOR TESTS ===")
-        self.test("AppArmor Status Check", self.test_apparmor_check)
-        self.test("AppArmor Profile Exists", self.test_profile_exists)
-        self.test("Lockdown Status Retrieval", self.test_lockdown_status)
-        
-        # Integrity Tests
-        logger.info("\n=== INTEGRITY TESTS ===")
-        self.test("Integrity Baseline Creation", self.test_integrity_baseline)
-        self.test("Integrity Verification", self.test_integrity_verify)
-        
-        # Print summary
-        self.print_summary()
+        logger.info("\n%s\nPHASE 4: SECURITY HARDENING TESTS\n%s\n", _HASH_BAR, _HASH_BAR)
+        
+        # The AppArmor and integrity groups share no state: run the two
+        # groups side by side, the tests within each in order
+        apparmor_tests = [
+            ("AppArmor Status Check", self.test_apparmor_check),
+            ("AppArmor Profile Exists", self.test_profile_exists),
+            ("Lockdown Status Retrieval", self.test_lockdown_status),
+        ]
+        integrity_tests = [
+            ("Integrity Baseline Creation", self.test_integrity_baseline),
+            ("Integrity Verification", self.test_integrity_verify),
+            ("Integrity Edited File Re-baseline", self.test_integrity_rebaseline),
+        ]
+        logger.info("\n=== APPARMOR + INTEGRITY TESTS (concurrent) ===")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for future in [pool.submit(self._run_group, group)
+                           for group in (apparmor_tests, integrity_tests)]:
+                future.result()
+        
+        # Summarize in declaration order, not completion order
+        order = {name: i for i, (name, _) in enumerate(apparmor_tests + integrity_tests)}
+        self.results.sort(key=lambda r: order[r[0]])
+        
+        if 'checker' in self.__dict__:
+            self._scratch.cleanup()
+        
+        # Print summary; under PHASE4_QUIET the exit code is the only signal
+        return self.print_summary()
     
     def print_summary(self):
         """Print test summary."""
-        logger.info(f"\n{'#'*60}")
-        logger.info("TEST SUMMARY")
-        logger.info(f"{'#'*60}\n")
+        logger.info("\n%s\nTEST SUMMARY\n%s\n", _HASH_BAR, _HASH_BAR)
         
         passed = sum(1 for _, result, _ in self.results if result)
         total = len(self.results)
         
         for name, result, error in self.results:
-            status = "✓ PASS" if result else "✗ FAIL"
-            logger.info(f"{status}: {name}")
+            logger.info("%s: %s", "✓ PASS" if result else "✗ FAIL", name)
             if error:
-                logger.info(f"  Error: {error}")
+                logger.info("  Error: %s", error)
         
-        logger.info(f"\nResults: {passed}/{total} tests passed")
+        logger.info("\nResults: %d/%d tests passed", passed, total)
         
         if passed == total:
             logger.info("🎉 ALL TESTS PASSED!")
             return 0
         else:
-            logger.warning(f"⚠️  {total - passed} test(s) failed")
+            logger.warning("⚠️  %d test(s) failed", total - passed)
             return 1
 
 
 def main():
+    # Configured here, not at import, so other runners keep their own setup;
+    # PHASE4_QUIET=1 keeps only warnings and errors
+    logging.basicConfig(
+        level=logging.WARNING if os.environ.get('PHASE4_QUIET') else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     print("\n" + "="*60)
     print("SECURE EXAM SYSTEM - PHASE 4 TESTS")
     print("="*60)